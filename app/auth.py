@@ -38,6 +38,11 @@ def create_access_token(data: dict, expires_delta: None | timedelta = None):
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> None:
+    return await get_user_from_token(token)
+
+
+async def get_user_from_token(token: str):
+    """Resolve the user of an access token, also used where no header is sent."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -0,0 +1,123 @@
+"""In-process tier of the result cache, in front of Redis."""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.settings import settings
+
+
+@dataclass
+class CacheStats:
+    """Lookups of one cached function, by the tier that answered them."""
+
+    local_hits: int = 0
+    redis_hits: int = 0
+    # Hits on a cached 404, counted in their tier's hits as well
+    negative_hits: int = 0
+    # Redis hits past their ttl, served while refreshed
+    stale_hits: int = 0
+    # Background refreshes of stale entries, and those that failed
+    refreshes: int = 0
+    refresh_errors: int = 0
+    # Misses that waited on the call of a concurrent miss, in this process
+    coalesced: int = 0
+    # Misses that waited on the call of another replica
+    lock_waits: int = 0
+    # Misses that called the function
+    misses: int = 0
+
+    def as_dict(self) -> dict:
+        lookups = (
+            self.local_hits
+            + self.redis_hits
+            + self.coalesced
+            + self.lock_waits
+            + self.misses
+        )
+        redis_lookups = lookups - self.local_hits
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "negative_hits": self.negative_hits,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "coalesced": self.coalesced,
+            "lock_waits": self.lock_waits,
+            "misses": self.misses,
+            "local_hit_ratio": round(self.local_hits / lookups, 3) if lookups else None,
+            "redis_hit_ratio": (
+                round(self.redis_hits / redis_lookups, 3) if redis_lookups else None
+            ),
+        }
+
+
+class LocalCache:
+    """
+    LRU cache of serialized results with a TTL per entry, bounded by entry
+    count and by the total size of the payloads.
+
+    Payloads are kept serialized, callers decode their own copy and can't
+    alter a shared object. Expired entries are dropped when looked up or
+    when evicted as the least recently used.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.cache_local_max_entries,
+        max_bytes: int = settings.cache_local_max_bytes,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> None | str:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def set(self, key: str, payload: str, ttl: float):
+        if ttl <= 0 or len(payload) > self.max_bytes:
+            self.delete(key)
+            return
+        self.delete(key)
+        self._entries[key] = (time.monotonic() + ttl, payload)
+        self.size += len(payload)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def replace(self, key: str, payload: str, ttl: float):
+        """Update an entry only if it is cached."""
+        if key in self._entries:
+            self.set(key, payload, ttl)
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.size}
+
+
+# Shared by every cached function of the process
+local_cache = LocalCache()
+
+# Function name -> lookups of its cache
+cache_stats: dict[str, CacheStats] = {}
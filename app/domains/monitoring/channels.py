@@ -0,0 +1,126 @@
+import zlib
+
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+from app.domains.monitoring.enums import ChannelLayout
+from app.settings import settings
+
+
+class ShardedPubSub(PubSub):
+    """
+    Async PubSub with the sharded commands redis-py only has in its sync client.
+
+    Shard channels are remembered so they are subscribed again on reconnect,
+    and ``smessage`` deliveries are returned like regular messages.
+    """
+
+    PUBLISH_MESSAGE_TYPES = (*PubSub.PUBLISH_MESSAGE_TYPES, "smessage")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_channels: set[str] = set()
+
+    @property
+    def subscribed(self):
+        return super().subscribed or bool(self.shard_channels)
+
+    async def ssubscribe(self, *channels: str):
+        await self.execute_command("SSUBSCRIBE", *channels)
+        self.shard_channels.update(channels)
+
+    async def sunsubscribe(self, *channels: str):
+        self.shard_channels.difference_update(channels)
+        await self.execute_command("SUNSUBSCRIBE", *channels)
+
+    async def on_connect(self, connection):
+        await super().on_connect(connection)
+        if self.shard_channels:
+            await self.execute_command("SSUBSCRIBE", *self.shard_channels)
+
+
+class TaskChannelLayout:
+    """
+    Where task updates are published, shared by the publishing workers and the
+    monitoring subscribers, which must run with the same settings.
+
+    ``PATTERN`` publishes to ``{channel}_{task_id}``; the hub matches every
+    channel with one pattern subscription, which Redis evaluates against every
+    PUBLISH. ``SHARDED`` publishes with SPUBLISH to ``{channel}:{shard}``, the
+    shard being a stable hash of the task id. The hub subscribes each shard
+    with SSUBSCRIBE, and Redis delivers shard messages without matching any
+    pattern.
+
+    Both layouts need a single Redis node, ``SHARDED`` needs Redis 7. The hub
+    subscribes every shard on one plain connection, which Redis Cluster
+    rejects with CROSSSLOT as the shards hash to different slots.
+    """
+
+    def __init__(
+        self,
+        channel: str = settings.task_channel,
+        layout: ChannelLayout = settings.task_channel_layout,
+        shards: int = settings.task_channel_shards,
+    ):
+        self.channel = channel
+        self.layout = layout
+        self.shards = shards
+
+    @property
+    def sharded(self) -> bool:
+        return self.layout == ChannelLayout.SHARDED
+
+    def shard(self, task_id: str) -> int:
+        # crc32 rather than hash(), it must agree across processes
+        return zlib.crc32(task_id.encode()) % self.shards
+
+    def task_channel(self, task_id: str) -> str:
+        """The channel the updates of a task are published to."""
+        if self.sharded:
+            return f"{self.channel}:{self.shard(task_id)}"
+        return f"{self.channel}_{task_id}"
+
+    def channel_task_id(self, channel: str) -> None | str:
+        """The task a channel belongs to, unknown for a shard channel."""
+        if self.sharded:
+            return None
+        return channel.removeprefix(f"{self.channel}_")
+
+    def publish(self, redis_conn: Redis, task_id: str, message: str):
+        """Publish a task update, ``redis_conn`` may be a pipeline."""
+        if self.sharded:
+            return redis_conn.spublish(self.task_channel(task_id), message)
+        return redis_conn.publish(self.task_channel(task_id), message)
+
+    def pubsub(self, redis_conn: Redis) -> PubSub:
+        if self.sharded:
+            return ShardedPubSub(redis_conn.connection_pool)
+        return redis_conn.pubsub()
+
+    async def subscribe_all(self, pubsub: PubSub):
+        """Subscribe to the updates of every task."""
+        if self.sharded:
+            await pubsub.ssubscribe(*self._shard_channels())
+        else:
+            await pubsub.psubscribe(f"{self.channel}_*")
+
+    async def unsubscribe_all(self, pubsub: PubSub):
+        if self.sharded:
+            await pubsub.sunsubscribe(*self._shard_channels())
+        else:
+            await pubsub.punsubscribe(f"{self.channel}_*")
+
+    async def subscribe(self, pubsub: PubSub, channel: str):
+        if self.sharded:
+            await pubsub.ssubscribe(channel)
+        else:
+            await pubsub.subscribe(channel)
+
+    async def unsubscribe(self, pubsub: PubSub, channel: str):
+        if self.sharded:
+            await pubsub.sunsubscribe(channel)
+        else:
+            await pubsub.unsubscribe(channel)
+
+    def _shard_channels(self) -> list[str]:
+        return [f"{self.channel}:{shard}" for shard in range(self.shards)]
@@ -0,0 +1,79 @@
+"""Frame encodings monitor WebSockets negotiate through their subprotocol."""
+
+import zlib
+from typing import Iterable
+
+from fastapi import WebSocket
+
+from app.domains.monitoring.enums import FrameEncoding
+from app.settings import settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+
+def supported_encodings() -> list[FrameEncoding]:
+    if msgpack is None:
+        return [FrameEncoding.JSON, FrameEncoding.JSON_DEFLATE]
+    return list(FrameEncoding)
+
+
+def negotiate_encoding(subprotocols: Iterable[str]) -> None | FrameEncoding:
+    """The first subprotocol offered by the client that is supported here."""
+    supported = supported_encodings()
+    for subprotocol in subprotocols:
+        if subprotocol in supported:
+            return FrameEncoding(subprotocol)
+    return None
+
+
+async def accept_monitor(websocket: WebSocket) -> FrameEncoding:
+    """Accept a monitor WebSocket, agreeing on its frame encoding."""
+    encoding = negotiate_encoding(websocket.scope.get("subprotocols", ()))
+    await websocket.accept(subprotocol=encoding)
+    return encoding or FrameEncoding.JSON
+
+
+def deflate(data: bytes) -> bytes:
+    """Raw deflate, as permessage-deflate would, but computed once per payload."""
+    compressor = zlib.compressobj(
+        settings.monitor_deflate_level, zlib.DEFLATED, -zlib.MAX_WBITS
+    )
+    return compressor.compress(data) + compressor.flush()
+
+
+def encode_payload(message, encoding: FrameEncoding) -> str | bytes:
+    """
+    Encode one ``TaskUpdateMessage``. JSON goes out as the published text
+    frame, the other encodings as binary frames.
+    """
+    if encoding == FrameEncoding.JSON_DEFLATE:
+        return deflate(message.raw.encode())
+    if encoding == FrameEncoding.MSGPACK:
+        return msgpack.packb(message.data)
+    return message.raw
+
+
+def _msgpack_array_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length < 2**16:
+        return b"\xdc" + length.to_bytes(2, "big")
+    return b"\xdd" + length.to_bytes(4, "big")
+
+
+def encode_batch(messages: list, encoding: FrameEncoding) -> str | bytes:
+    """
+    Encode several updates as one array frame, reusing each message's cached
+    payload; only a deflated batch is compressed for the recipient.
+    """
+    if encoding == FrameEncoding.MSGPACK:
+        return _msgpack_array_header(len(messages)) + b"".join(
+            message.encoded(encoding) for message in messages
+        )
+    frame = f"[{','.join(message.raw for message in messages)}]"
+    if encoding == FrameEncoding.JSON_DEFLATE:
+        return deflate(frame.encode())
+    return frame
@@ -0,0 +1,25 @@
+from enum import StrEnum
+
+
+class OverflowPolicy(StrEnum):
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
+class PersistenceMode(StrEnum):
+    PUBSUB = "pubsub"
+    STREAM = "stream"
+
+
+class ChannelLayout(StrEnum):
+    PATTERN = "pattern"
+    SHARDED = "sharded"
+
+
+class FrameEncoding(StrEnum):
+    """Encodings a monitor WebSocket negotiates as its subprotocol"""
+
+    JSON = "json"
+    JSON_DEFLATE = "json+deflate"
+    MSGPACK = "msgpack"
@@ -0,0 +1,107 @@
+import itertools
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Hashable
+
+from app.domains.monitoring.messages import TaskUpdateMessage
+
+# Filter attribute -> field of the published update it constrains
+FILTER_FIELDS = (
+    ("created_by", "created_by"),
+    ("statuses", "status"),
+    ("task_types", "task_type"),
+)
+
+# Bucket of the subscribers that leave a field unconstrained
+_ANY = object()
+
+
+@dataclass(frozen=True)
+class TaskFilter:
+    """
+    Server-side subscription filter.
+    Each field holds the accepted values, ``None`` accepts any value.
+    """
+
+    created_by: None | frozenset[str] = None
+    statuses: None | frozenset[str] = None
+    task_types: None | frozenset[str] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return all(getattr(self, attribute) is None for attribute, _ in FILTER_FIELDS)
+
+    def matches(self, task_data: dict) -> bool:
+        for attribute, field in FILTER_FIELDS:
+            accepted = getattr(self, attribute)
+            if accepted is not None and task_data.get(field) not in accepted:
+                return False
+        return True
+
+
+class SubscriptionIndex:
+    """
+    Match a task update to the subscribers whose filter accepts it.
+
+    Filters are compiled into one inverted index per field, value -> subscribers,
+    plus a bucket of subscribers that do not constrain that field. An update's
+    candidates for a field are its value bucket and that field's any-bucket; the
+    smallest candidate set is walked and checked against the other fields, so
+    the cost depends on the interested subscribers rather than on all of them.
+    Unfiltered subscribers are kept apart and never touch the index.
+    """
+
+    def __init__(self):
+        self.unfiltered: set[Hashable] = set()
+        self.filters: dict[Hashable, TaskFilter] = {}
+        self._index: dict[str, defaultdict[object, set[Hashable]]] = {
+            attribute: defaultdict(set) for attribute, _ in FILTER_FIELDS
+        }
+
+    def add(self, subscriber: Hashable, task_filter: None | TaskFilter = None):
+        if task_filter is None or task_filter.is_empty:
+            self.unfiltered.add(subscriber)
+            return
+
+        self.filters[subscriber] = task_filter
+        for attribute, _ in FILTER_FIELDS:
+            for value in getattr(task_filter, attribute) or (_ANY,):
+                self._index[attribute][value].add(subscriber)
+
+    def discard(self, subscriber: Hashable):
+        self.unfiltered.discard(subscriber)
+        task_filter = self.filters.pop(subscriber, None)
+        if task_filter is None:
+            return
+
+        for attribute, _ in FILTER_FIELDS:
+            buckets = self._index[attribute]
+            for value in getattr(task_filter, attribute) or (_ANY,):
+                bucket = buckets[value]
+                bucket.discard(subscriber)
+                if not bucket:
+                    del buckets[value]
+
+    def match(self, message: TaskUpdateMessage) -> list[Hashable]:
+        """Subscribers to deliver ``message`` to; parses it only if filters exist."""
+        if not self.filters:
+            return list(self.unfiltered)
+
+        task_data = message.data
+        candidates = sorted(
+            (
+                (
+                    self._index[attribute].get(_ANY, ()),
+                    self._index[attribute].get(task_data.get(field), ()),
+                )
+                for attribute, field in FILTER_FIELDS
+            ),
+            key=lambda buckets: len(buckets[0]) + len(buckets[1]),
+        )
+        (any_bucket, value_bucket), *others = candidates
+        matched = [
+            subscriber
+            for subscriber in itertools.chain(any_bucket, value_bucket)
+            if all(subscriber in a or subscriber in v for a, v in others)
+        ]
+        return [*self.unfiltered, *matched]
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from app.domains.monitoring.messages import TaskUpdateMessage
+from app.settings import settings
+
+PING = TaskUpdateMessage.from_data({"type": "ping"})
+
+
+@dataclass
+class HeartbeatStats:
+    pings_sent: int = 0
+    reaped_connections: int = 0
+
+
+class HeartbeatWheel:
+    """
+    Application-level ping/pong for monitor WebSockets, driven by one timer wheel.
+
+    Each connection sits in the slot of its next deadline; a single task
+    advances the wheel every ``tick`` seconds and only looks at the slot that
+    came due. A connection idle for ``ping_interval`` gets a ``{"type": "ping"}``
+    frame, any message from the client counts as the pong. One idle for
+    ``idle_timeout``, as a half-open connection behind a load balancer would
+    be, is evicted like a slow client, which releases it and its watch.
+    """
+
+    def __init__(
+        self,
+        ping_interval: float = settings.monitor_ping_interval,
+        idle_timeout: float = settings.monitor_idle_timeout,
+        tick: float = settings.monitor_heartbeat_tick,
+    ):
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.tick = tick
+        self.stats = HeartbeatStats()
+        self._slots: list[set] = [
+            set() for _ in range(math.ceil(idle_timeout / tick) + 1)
+        ]
+        self._cursor = 0
+        self._slot_of: dict = {}
+        self._wheel_task = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def add(self, connection):
+        """Start tracking a connection, its idle time counts from now."""
+        connection.touch()
+        self._schedule(connection, self.ping_interval)
+
+    def discard(self, connection):
+        slot = self._slot_of.pop(connection, None)
+        if slot is not None:
+            self._slots[slot].discard(connection)
+
+    def _schedule(self, connection, delay: float):
+        ticks = min(max(1, math.ceil(delay / self.tick)), len(self._slots) - 1)
+        slot = (self._cursor + ticks) % len(self._slots)
+        self._slots[slot].add(connection)
+        self._slot_of[connection] = slot
+
+    def advance(self, now: None | float = None):
+        """Move to the next slot, pinging or reaping the connections due."""
+        now = time.monotonic() if now is None else now
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        due, self._slots[self._cursor] = self._slots[self._cursor], set()
+
+        stale = []
+        for connection in due:
+            del self._slot_of[connection]
+            if connection.closed:
+                continue
+            idle = now - connection.last_seen
+            if idle >= self.idle_timeout:
+                stale.append(connection)
+            elif idle >= self.ping_interval:
+                connection.send(PING, key=PING)
+                self.stats.pings_sent += 1
+                self._schedule(connection, self.idle_timeout - idle)
+            else:
+                self._schedule(connection, self.ping_interval - idle)
+
+        for connection in stale:
+            connection.evict(f"no message for {self.idle_timeout}s")
+        self.stats.reaped_connections += len(stale)
+
+    def start(self):
+        async def turn():
+            while True:
+                await asyncio.sleep(self.tick)
+                try:
+                    self.advance()
+                except Exception:
+                    self.logger.exception("Unable to advance the heartbeat wheel")
+
+        self._wheel_task = asyncio.create_task(turn())
+
+    async def stop(self):
+        if self._wheel_task:
+            self._wheel_task.cancel()
+            try:
+                await self._wheel_task
+            except asyncio.CancelledError:
+                self.logger.info("Heartbeat wheel stopped.")
@@ -1,68 +1,351 @@
 import asyncio
-import json
+import itertools
 import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
 
-from app.domains.task import TaskResult, TaskUpdate
-from app.redis import get_redis
-from app.repositories.task import set_up_task_repository
-from app.repositories.task_result import set_up_task_result_repository
+from app.domains.monitoring.channels import TaskChannelLayout
+from app.domains.monitoring.encoding import accept_monitor, encode_batch
+from app.domains.monitoring.enums import FrameEncoding, OverflowPolicy, PersistenceMode
+from app.domains.monitoring.filters import SubscriptionIndex, TaskFilter
+from app.domains.monitoring.heartbeat import HeartbeatWheel
+from app.domains.monitoring.messages import TaskUpdateMessage
+from app.domains.monitoring.pipeline import (
+    PersistenceStage,
+    StageLatency,
+    TaskStatusEvent,
+)
+from app.domains.monitoring.sse import EventStream
+from app.domains.monitoring.stream import parse_event_id
+from app.domains.monitoring.waiters import TaskWaiters
+from app.domains.task import TERMINAL_TASK_STATUSES
+from app.domains.task.cache import refresh_cached_task_status
+from app.redis import create_redis_client
+from app.settings import settings
+
+
+@dataclass
+class MonitorStats:
+    """Delivery counters shared by the connections of one registry."""
+
+    dropped_frames: int = 0
+    coalesced_frames: int = 0
+    evicted_connections: int = 0
+
+
+class MonitorConnection:
+    """
+    Monitoring WebSocket with a bounded outbound queue and its own writer task.
+
+    Producers never await the socket: ``send`` only enqueues, so a stalled
+    client cannot delay other clients or the Pub/Sub listener. When the queue
+    is full the configured ``OverflowPolicy`` decides what to give up.
+
+    The writer starts once ``start`` has sent the replayed events, frames
+    queued meanwhile that were already part of the replay are skipped. With
+    ``ordered_events``, as for a single task, that check stops after the first
+    newer frame, so steady-state frames are forwarded without being parsed.
+
+    With a ``batch_interval`` the writer sends one array per interval, holding
+    only the latest update of each task queued within that window.
+
+    Frames are sent in the negotiated ``encoding``, binary encodings are
+    cached on the message and shared by every connection using them.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        stats: MonitorStats,
+        on_evict: None | Callable[["MonitorConnection"], Any] = None,
+        max_queue_size: int = settings.monitor_queue_size,
+        max_batch_tasks: int = settings.monitor_batch_max_tasks,
+        overflow_policy: OverflowPolicy = settings.monitor_overflow_policy,
+        send_timeout: float = settings.monitor_send_timeout,
+        batch_interval: None | float = None,
+        ordered_events: bool = False,
+        encoding: FrameEncoding = FrameEncoding.JSON,
+    ):
+        self.websocket = websocket
+        self.stats = stats
+        self.on_evict = on_evict
+        self.max_queue_size = max_queue_size
+        self.max_batch_tasks = max_batch_tasks
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.batch_interval = batch_interval
+        self.ordered_events = ordered_events
+        self.encoding = encoding
+        self.closed = False
+        self.last_seen = time.monotonic()
+        self.replayed_until: None | tuple[int, int] = None
+        self._pending: OrderedDict[Hashable, TaskUpdateMessage] = OrderedDict()
+        self._sequence = itertools.count()
+        self._ready = asyncio.Event()
+        self._writer_task = None
+        self._close_task = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._pending)
+
+    def touch(self):
+        """Record activity from the client, any message counts as a pong."""
+        self.last_seen = time.monotonic()
+
+    async def start(
+        self, replay: list[TaskUpdateMessage] = (), after: None | str = None
+    ):
+        """Send the replayed messages, then go live."""
+        if self.batch_interval and replay:
+            await self._send_frame(encode_batch(replay, self.encoding))
+        elif replay:
+            for message in replay:
+                await self._send(message)
+        last_event_id = replay[-1].event_id if replay else after
+        if last_event_id:
+            self.replayed_until = parse_event_id(last_event_id)
+        self._writer_task = asyncio.create_task(self._write())
+
+    def send(self, message: TaskUpdateMessage, key: None | str = None):
+        """Enqueue a frame, ``key`` identifies the task for coalescing."""
+        if self.closed:
+            return
+
+        coalesce = key is not None and (
+            self.overflow_policy == OverflowPolicy.COALESCE or bool(self.batch_interval)
+        )
+        if coalesce and key in self._pending:
+            self._pending[key] = message
+            self.stats.coalesced_frames += 1
+            return
+
+        # A batch holds the latest update of every task of its window, it is
+        # bounded by tasks rather than by the frames of an unbatched client
+        max_pending = (
+            self.max_batch_tasks if self.batch_interval else self.max_queue_size
+        )
+        if len(self._pending) >= max_pending:
+            if self.overflow_policy == OverflowPolicy.DISCONNECT:
+                self.evict("outbound queue overflow")
+                return
+            self._pending.popitem(last=False)
+            self.stats.dropped_frames += 1
+
+        self._pending[key if coalesce else next(self._sequence)] = message
+        self._ready.set()
+
+    async def _write(self):
+        try:
+            while True:
+                await self._ready.wait()
+                if self.batch_interval:
+                    await self._write_batch()
+                    continue
+                while self._pending:
+                    _, message = self._pending.popitem(last=False)
+                    if self._replayed(message):
+                        continue
+                    await asyncio.wait_for(self._send(message), self.send_timeout)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.evict(f"failed send: {e!r}")
+
+    async def _send(self, message: TaskUpdateMessage):
+        await self._send_frame(message.encoded(self.encoding))
+
+    async def _send_frame(self, frame: str | bytes):
+        if isinstance(frame, bytes):
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+
+    async def _write_batch(self):
+        """Let the window fill up, then send everything pending as one frame."""
+        await asyncio.sleep(self.batch_interval)
+        messages = [
+            message for message in self._pending.values() if not self._replayed(message)
+        ]
+        self._pending.clear()
+        self._ready.clear()
+        if messages:
+            await asyncio.wait_for(
+                self._send_frame(encode_batch(messages, self.encoding)),
+                self.send_timeout,
+            )
+
+    def _replayed(self, message: TaskUpdateMessage) -> bool:
+        if self.replayed_until is None or message.event_id is None:
+            return False
+        if parse_event_id(message.event_id) <= self.replayed_until:
+            return True
+        if self.ordered_events:
+            self.replayed_until = None
+        return False
+
+    def evict(self, reason: str):
+        """Give up on a slow or broken client and close its socket."""
+        if self.closed:
+            return
+        self.logger.warning(f"Evicting WebSocket after {reason}")
+        self.stats.evicted_connections += 1
+        self.stats.dropped_frames += len(self._pending)
+        self.close()
+        self._close_task = asyncio.create_task(self._close_socket())
+        if self.on_evict:
+            self.on_evict(self)
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop the writer task and drop any pending frames."""
+        self.closed = True
+        self._pending.clear()
+        if self._writer_task and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+
+
+class EventStreamConnection(MonitorConnection):
+    """
+    Monitor connection delivering to a Server-Sent Events response.
+
+    Same queueing and overflow handling as a WebSocket, frames carry the
+    update's ``event_id`` as the SSE id so browsers resume with Last-Event-ID.
+    """
+
+    async def _send(self, message: TaskUpdateMessage):
+        await self.websocket.send_event(message.raw, message.event_id)
 
 
 class WebSocketConnectionManager:
     """
-    Manage WebSocket connections and broadcast messages to all connected clients
+    Manage WebSocket and Server-Sent Events connections and broadcast messages
+    to all connected clients whose subscription filter accepts them
     """
 
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    def __init__(self, heartbeat: None | HeartbeatWheel = None):
+        self.heartbeat = heartbeat
+        self.active_connections: dict[WebSocket | EventStream, MonitorConnection] = {}
+        self.subscriptions = SubscriptionIndex()
+        self.stats = MonitorStats()
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    async def connect(
+        self,
+        websocket: WebSocket,
+        batch_interval: None | float = None,
+        task_filter: None | TaskFilter = None,
+    ) -> MonitorConnection:
+        encoding = await accept_monitor(websocket)
+        connection = MonitorConnection(
+            websocket,
+            self.stats,
+            on_evict=lambda c: self.disconnect(c.websocket),
+            batch_interval=batch_interval,
+            encoding=encoding,
+        )
+        self.active_connections[websocket] = connection
+        self.subscriptions.add(connection, task_filter)
+        if self.heartbeat:
+            self.heartbeat.add(connection)
         self.logger.info(
             f"WebSocket connected. {len(self.active_connections)} active connections."
         )
+        return connection
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def connect_event_stream(
+        self, stream: EventStream, task_filter: None | TaskFilter = None
+    ) -> EventStreamConnection:
+        connection = EventStreamConnection(
+            stream, self.stats, on_evict=lambda c: self.disconnect(c.websocket)
+        )
+        self.active_connections[stream] = connection
+        self.subscriptions.add(connection, task_filter)
         self.logger.info(
-            f"WebSocket disconnected. {len(self.active_connections)} active connections."
+            f"SSE stream connected. {len(self.active_connections)} active connections."
         )
+        return connection
 
-    async def broadcast(self, message: str):
+    def disconnect(self, websocket: WebSocket | EventStream):
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+        self.subscriptions.discard(connection)
+        if self.heartbeat:
+            self.heartbeat.discard(connection)
+        connection.close()
         self.logger.info(
+            f"WebSocket disconnected. {len(self.active_connections)} active connections."
+        )
+
+    def broadcast(self, message: TaskUpdateMessage, key: None | str = None):
+        self.logger.debug(
             f"Broadcasting message to {len(self.active_connections)} active connections."
         )
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        # match returns a snapshot, an overflowing connection may evict itself
+        for connection in self.subscriptions.match(message):
+            connection.send(message, key)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
 
 class RedisPubSubContextManagerV2:
-    def __init__(self, connection_manager, channel: str, redis_conn):
+    """
+    App-scoped monitoring hub.
+
+    Subscribes once per process to every task channel of the ``layout`` and
+    fans each task update out in memory to the WebSocket clients registered in
+    ``connection_manager``, and to the long-poll requests waiting in ``waiters``
+    for a task to complete. The task's status cache entry of this process is
+    replaced with each update.
+    Updates are staged: parse, broadcast immediately, then hand over to the
+    ``persistence`` stage without waiting, so a slow database never delays
+    live updates; updates the full stage can't take are dropped and counted.
+    In stream persistence mode there is no stage here, the hub only fans out.
+    """
+
+    def __init__(
+        self,
+        connection_manager,
+        layout: TaskChannelLayout,
+        redis_conn,
+        persistence: None | PersistenceStage,
+    ):
         self.connection_manager = connection_manager
-        self.channel = channel
+        self.layout = layout
         self.redis_conn = redis_conn
-        self.pubsub = redis_conn.pubsub()
+        self.pubsub = layout.pubsub(redis_conn)
+        self.persistence = persistence
+        self.waiters = TaskWaiters()
+        self.latency = {"parse": StageLatency(), "broadcast": StageLatency()}
         self.listener_task = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def setup(self):
         """Set up Redis connection and subscribe to the channel."""
-        self.logger.info(f"Subscribing to {self.channel}_*")
-        await self.pubsub.psubscribe(f"{self.channel}_*")
+        self.logger.info(f"Subscribing to {self.layout.layout} {self.layout.channel}")
+        await self.layout.subscribe_all(self.pubsub)
 
     async def start_listening(self):
         """Start the Redis Pub/Sub listener using asyncio.create_task."""
 
         async def handle_message(message):
-            if message and message["type"] == "message":
-                task_data = json.loads(message["data"])
+            if message and message["type"] in self.pubsub.PUBLISH_MESSAGE_TYPES:
+                started = time.perf_counter()
+                update = TaskUpdateMessage(message["data"])
+                task_data = update.data
 
                 task_id = task_data.get("task_id")
                 status = task_data.get("status")
@@ -72,21 +355,34 @@ class RedisPubSubContextManagerV2:
                     self.logger.error(f"Unable to parse message from queue: {message}")
                     return
 
-                async with set_up_task_repository() as task_repo:
-                    await task_repo.update(TaskUpdate(id=task_id, status=status))
-                if result:
-                    async with set_up_task_result_repository() as task_result_repo:
-                        await task_result_repo.add(
-                            TaskResult(task_id=task_id, result=result)
-                        )
-                await self.connection_manager.broadcast(message["data"])
+                parsed = time.perf_counter()
+                self.latency["parse"].observe(parsed - started)
+
+                self.connection_manager.broadcast(update, key=task_id)
+                if status in TERMINAL_TASK_STATUSES:
+                    self.waiters.resolve(task_id, task_data)
+                refresh_cached_task_status(task_data)
+                self.latency["broadcast"].observe(time.perf_counter() - parsed)
+
+                # Never wait on the database here, a full stage drops the update
+                # rather than stall the fan-out
+                if self.persistence and not self.persistence.submit_nowait(
+                    TaskStatusEvent(task_id=task_id, status=status, result=result)
+                ):
+                    self.logger.warning(f"Persistence is behind, dropped {task_id}")
 
         async def listen():
             self.logger.info("Listening to Redis Pub/Sub...")
             async for message in self.pubsub.listen():
-                self.logger.info(f"Message received: {message}")
-                await handle_message(message)
+                self.logger.debug(f"Message received: {message}")
+                try:
+                    await handle_message(message)
+                except Exception:
+                    # The listener is shared, one bad update must not stop it
+                    self.logger.exception(f"Unable to handle message: {message}")
 
+        if self.persistence:
+            self.persistence.start()
         # Run the Pub/Sub listener as an asyncio task
         self.listener_task = asyncio.create_task(listen())
 
@@ -102,21 +398,148 @@ class RedisPubSubContextManagerV2:
             except asyncio.CancelledError:
                 self.logger.info("Listener task cancelled.")
 
+        if self.persistence:
+            await self.persistence.stop()
+
         if self.pubsub:
-            await self.pubsub.unsubscribe(self.channel)
-            self.logger.info(f"Unsubscribed from Redis channel: {self.channel}")
+            await self.layout.unsubscribe_all(self.pubsub)
+            await self.pubsub.aclose()
+            self.logger.info(f"Unsubscribed from Redis channels: {self.layout.channel}")
 
         if self.redis_conn:
             await self.redis_conn.aclose()
             self.logger.info("Closed Redis connection.")
 
 
+class TaskChannelMultiplexer:
+    """
+    Multiplex single task monitors over one shared Pub/Sub connection.
+
+    A task channel is subscribed when its first local watcher arrives and
+    unsubscribed when the last one leaves. With a sharded layout several tasks
+    share a channel, which stays subscribed while any of them is watched.
+    Messages are routed through a task_id -> sockets index, so only the
+    watchers of a task are visited.
+    """
+
+    def __init__(
+        self,
+        layout: TaskChannelLayout,
+        redis_conn,
+        heartbeat: None | HeartbeatWheel = None,
+    ):
+        self.layout = layout
+        self.heartbeat = heartbeat
+        self.redis_conn = redis_conn
+        self.pubsub = layout.pubsub(redis_conn)
+        self.watchers: dict[str, set[MonitorConnection]] = {}
+        self.channel_tasks: dict[str, set[str]] = {}
+        self.stats = MonitorStats()
+        self.listener_task = None
+        self._subscription_lock = asyncio.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def watch(
+        self,
+        task_id: str,
+        websocket: WebSocket,
+        encoding: FrameEncoding = FrameEncoding.JSON,
+    ) -> MonitorConnection:
+        """Register a socket for a task, subscribing on the first watcher."""
+        connection = MonitorConnection(
+            websocket,
+            self.stats,
+            on_evict=lambda c: self.watchers.get(task_id, set()).discard(c),
+            ordered_events=True,
+            encoding=encoding,
+        )
+        async with self._subscription_lock:
+            connections = self.watchers.setdefault(task_id, set())
+            if not connections:
+                channel = self.layout.task_channel(task_id)
+                tasks = self.channel_tasks.setdefault(channel, set())
+                if not tasks:
+                    self.logger.info(f"Subscribing to {channel}")
+                    await self.layout.subscribe(self.pubsub, channel)
+                tasks.add(task_id)
+            connections.add(connection)
+        if self.heartbeat:
+            self.heartbeat.add(connection)
+        return connection
+
+    async def unwatch(self, task_id: str, connection: MonitorConnection):
+        """Unregister a socket, unsubscribing when the last watcher leaves."""
+        if self.heartbeat:
+            self.heartbeat.discard(connection)
+        connection.close()
+        async with self._subscription_lock:
+            connections = self.watchers.get(task_id)
+            if connections is None:
+                return
+            connections.discard(connection)
+            if not connections:
+                # An evicted connection leaves the subscription for its route
+                del self.watchers[task_id]
+                channel = self.layout.task_channel(task_id)
+                tasks = self.channel_tasks.get(channel, set())
+                tasks.discard(task_id)
+                if not tasks:
+                    self.channel_tasks.pop(channel, None)
+                    self.logger.info(f"Unsubscribing from {channel}")
+                    await self.layout.unsubscribe(self.pubsub, channel)
+
+    def deliver(self, task_id: str, message: TaskUpdateMessage):
+        """Enqueue a message for the watchers of a single task."""
+        for connection in list(self.watchers.get(task_id, ())):
+            connection.send(message, task_id)
+
+    async def start_listening(self):
+        """Start reading the shared Pub/Sub connection using asyncio.create_task."""
+        # Connect eagerly, the connection idles until the first watcher subscribes
+        await self.pubsub.connect()
+
+        async def listen():
+            self.logger.info("Listening to task channels...")
+            while True:
+                message = await self.pubsub.get_message(timeout=1.0)
+                if message and message["type"] in self.pubsub.PUBLISH_MESSAGE_TYPES:
+                    try:
+                        update = TaskUpdateMessage(message["data"])
+                        # A shard channel carries several tasks, the payload
+                        # tells which
+                        task_id = self.layout.channel_task_id(message["channel"])
+                        self.deliver(task_id or update.task_id, update)
+                    except Exception:
+                        # The listener is shared, one bad update must not stop it
+                        self.logger.exception(f"Unable to deliver message: {message}")
+
+        self.listener_task = asyncio.create_task(listen())
+
+    async def cleanup(self):
+        """Stop the listener task and release the shared Pub/Sub connection."""
+        if self.listener_task:
+            self.listener_task.cancel()
+            try:
+                await self.listener_task
+            except asyncio.CancelledError:
+                self.logger.info("Listener task cancelled.")
+
+        if self.pubsub:
+            await self.pubsub.aclose()
+            self.logger.info("Closed task channels Pub/Sub connection.")
+
+
 async def create_redis_pubsub_context_manager(
-    channel: str = "task_updates",
+    layout: None | TaskChannelLayout = None,
+    heartbeat: None | HeartbeatWheel = None,
 ) -> RedisPubSubContextManagerV2:
-    async for redis_conn in get_redis():
-        return RedisPubSubContextManagerV2(
-            connection_manager=WebSocketConnectionManager(),
-            channel=channel,
-            redis_conn=redis_conn,
-        )
+    return RedisPubSubContextManagerV2(
+        connection_manager=WebSocketConnectionManager(heartbeat),
+        layout=layout or TaskChannelLayout(),
+        redis_conn=create_redis_client(),
+        persistence=(
+            PersistenceStage()
+            if settings.persistence_mode == PersistenceMode.PUBSUB
+            else None
+        ),
+    )
@@ -0,0 +1,49 @@
+from app import serialization
+from app.domains.monitoring.encoding import encode_payload
+from app.domains.monitoring.enums import FrameEncoding
+
+
+class TaskUpdateMessage:
+    """
+    A published task update shared by every recipient in the process.
+
+    The payload is forwarded to sockets as received; it is parsed lazily and
+    at most once, only when a field such as ``task_id`` is actually needed.
+    Other frame encodings are computed once, by the first recipient that
+    negotiated them, and shared with the others.
+    """
+
+    __slots__ = ("raw", "_data", "_encoded")
+
+    def __init__(self, raw: str, data: None | dict = None):
+        self.raw = raw
+        self._data = data
+        self._encoded: None | dict[FrameEncoding, bytes] = None
+
+    @classmethod
+    def from_data(cls, data: dict) -> "TaskUpdateMessage":
+        return cls(serialization.dumps(data), data)
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = serialization.loads(self.raw)
+        return self._data
+
+    def encoded(self, encoding: FrameEncoding) -> str | bytes:
+        if encoding == FrameEncoding.JSON:
+            return self.raw
+        if self._encoded is None:
+            self._encoded = {}
+        frame = self._encoded.get(encoding)
+        if frame is None:
+            frame = self._encoded[encoding] = encode_payload(self, encoding)
+        return frame
+
+    @property
+    def task_id(self) -> None | str:
+        return self.data.get("task_id")
+
+    @property
+    def event_id(self) -> None | str:
+        return self.data.get("event_id")
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.domains.task import TaskResult, TaskUpdate
+from app.repositories.task import set_up_task_repository
+from app.repositories.task_result import set_up_task_result_repository
+from app.settings import settings
+
+
+@dataclass
+class TaskStatusEvent:
+    task_id: str
+    status: str
+    result: None | dict = None
+    stream_id: None | str = None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class StageLatency:
+    """Running latency counters of one pipeline stage."""
+
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        average = self.total_seconds / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(average * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class PersistenceStage:
+    """
+    Write-behind persistence of task status updates, off the broadcast path.
+
+    Events are partitioned by task_id over ``workers`` bounded queues, each
+    drained by its own worker. A worker buffers events for up to
+    ``flush_interval_ms`` or ``batch_size`` rows, keeps only the latest status
+    per task and flushes the buffer with one multi-row UPDATE plus one bulk
+    INSERT of results. Updates of one task are therefore written in order
+    while different partitions flush concurrently. ``on_flushed`` is awaited
+    with every batch that was written successfully. A batch that fails to
+    flush is retried once, then dropped and counted in ``failed_events``.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.persistence_workers,
+        queue_size: int = settings.persistence_queue_size,
+        batch_size: int = settings.persistence_batch_size,
+        flush_interval_ms: int = settings.persistence_flush_interval_ms,
+    ):
+        self.queues: list[asyncio.Queue[TaskStatusEvent]] = [
+            asyncio.Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.latency = {"queue_wait": StageLatency(), "flush": StageLatency()}
+        self.flushed_events = 0
+        self.flushed_rows = 0
+        self.dropped_events = 0
+        self.retried_events = 0
+        self.failed_events = 0
+        self.on_flushed: None | Callable[[list[TaskStatusEvent]], Awaitable[None]] = (
+            None
+        )
+        self.worker_tasks: list[asyncio.Task] = []
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def _queue(self, event: TaskStatusEvent) -> asyncio.Queue[TaskStatusEvent]:
+        return self.queues[hash(event.task_id) % len(self.queues)]
+
+    async def submit(self, event: TaskStatusEvent):
+        """Enqueue an event, waiting only when its partition is full."""
+        await self._queue(event).put(event)
+
+    def submit_nowait(self, event: TaskStatusEvent) -> bool:
+        """
+        Enqueue an event without waiting, for callers that must not be held up
+        by a slow database. An event whose partition is full is dropped and
+        counted in ``dropped_events``.
+        """
+        try:
+            self._queue(event).put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped_events += 1
+            return False
+        return True
+
+    def start(self):
+        self.worker_tasks = [
+            asyncio.create_task(self._work(queue)) for queue in self.queues
+        ]
+
+    async def _collect(
+        self, queue: asyncio.Queue[TaskStatusEvent]
+    ) -> list[TaskStatusEvent]:
+        """Wait for one event, then buffer more until the batch is due."""
+        batch = [await queue.get()]
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _work(self, queue: asyncio.Queue[TaskStatusEvent]):
+        while True:
+            batch = await self._collect(queue)
+            started = time.perf_counter()
+            for event in batch:
+                self.latency["queue_wait"].observe(started - event.enqueued_at)
+            try:
+                try:
+                    rows = await self._flush(batch)
+                except Exception:
+                    self.retried_events += len(batch)
+                    self.logger.warning(
+                        f"Retrying to flush {len(batch)} task updates", exc_info=True
+                    )
+                    await asyncio.sleep(self.flush_interval)
+                    rows = await self._flush(batch)
+                self.flushed_rows += rows
+                self.flushed_events += len(batch)
+                if self.on_flushed:
+                    await self.on_flushed(batch)
+            except Exception:
+                self.failed_events += len(batch)
+                self.logger.exception(f"Unable to flush {len(batch)} task updates")
+            finally:
+                self.latency["flush"].observe(time.perf_counter() - started)
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: list[TaskStatusEvent]) -> int:
+        # Later events win, only the latest status of a task is written
+        statuses = {event.task_id: event.status for event in batch}
+        results = [
+            TaskResult(task_id=event.task_id, result=event.result)
+            for event in batch
+            if event.result
+        ]
+
+        async with set_up_task_repository() as task_repo:
+            await task_repo.update_statuses(
+                [
+                    TaskUpdate(id=task_id, status=status)
+                    for task_id, status in statuses.items()
+                ]
+            )
+        if results:
+            async with set_up_task_result_repository() as task_result_repo:
+                await task_result_repo.add_many(results)
+
+        return len(statuses) + len(results)
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush the buffered events on shutdown, then stop the workers."""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self.queues)), timeout
+            )
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Dropping {self.queue_depth} unpersisted events")
+
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "flushed_events": self.flushed_events,
+            "flushed_rows": self.flushed_rows,
+            "dropped_events": self.dropped_events,
+            "retried_events": self.retried_events,
+            "failed_events": self.failed_events,
+            "latency": {name: stage.as_dict() for name, stage in self.latency.items()},
+        }
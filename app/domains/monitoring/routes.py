@@ -1,55 +1,264 @@
-import json
 import logging
-from typing import Annotated
+from dataclasses import asdict
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from redis.asyncio import Redis
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from fastapi.requests import HTTPConnection
+from fastapi.responses import StreamingResponse
+from rq import Queue
 
-from app.domains.monitoring.manager import WebSocketConnectionManager
-from app.redis import get_redis
+from app.auth import get_user_from_token
+from app.cache import cache_stats, local_cache
+from app.domains.monitoring.encoding import accept_monitor
+from app.domains.monitoring.filters import TaskFilter
+from app.domains.monitoring.manager import (
+    MonitorConnection,
+    RedisPubSubContextManagerV2,
+    TaskChannelMultiplexer,
+)
+from app.domains.monitoring.sse import SSE_HEADERS, EventStream, format_event
+from app.domains.monitoring.stream import (
+    EVENT_ID_PATTERN,
+    read_task_events,
+    read_task_state,
+)
+from app.domains.task import TaskStatus, TaskType
+from app.redis import get_task_queue
+from app.repositories.exceptions import NotFoundException
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-manager = WebSocketConnectionManager()
+
+
+def get_monitoring_hub(connection: HTTPConnection) -> RedisPubSubContextManagerV2:
+    """Returns the app-scoped monitoring hub."""
+    return connection.app.state.monitoring_hub
+
+
+def get_task_multiplexer(websocket: WebSocket) -> TaskChannelMultiplexer:
+    """Returns the app-scoped multiplexer of single task channels."""
+    return websocket.app.state.task_multiplexer
+
+
+async def get_task_filter(
+    connection: HTTPConnection,
+    created_by: Annotated[None | Literal["me"], Query()] = None,
+    token: Annotated[None | str, Query()] = None,
+    task_status: Annotated[None | list[TaskStatus], Query(alias="status")] = None,
+    task_type: Annotated[None | list[TaskType], Query()] = None,
+) -> TaskFilter:
+    """
+    Build the subscription filter of a monitor from its query parameters.
+    ``created_by=me`` needs the access token, passed as ``token`` since
+    browsers cannot set headers on WebSocket and EventSource requests.
+    """
+    user_ids = None
+    if created_by:
+        try:
+            user = await get_user_from_token(token or "")
+        except (HTTPException, NotFoundException):
+            if connection.scope["type"] == "websocket":
+                raise WebSocketException(
+                    code=status.WS_1008_POLICY_VIOLATION,
+                    reason="Could not validate credentials",
+                )
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+            )
+        user_ids = frozenset((user.id,))
+
+    return TaskFilter(
+        created_by=user_ids,
+        statuses=frozenset(task_status) if task_status else None,
+        task_types=frozenset(task_type) if task_type else None,
+    )
+
+
+async def receive_pongs(websocket: WebSocket, connection: MonitorConnection):
+    """
+    Read client messages until the client disconnects. Any text or binary
+    frame counts as a pong.
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(
+                message.get("code", status.WS_1000_NORMAL_CLOSURE),
+                message.get("reason"),
+            )
+        connection.touch()
+
+
+LastEventId = Annotated[None | str, Query(pattern=EVENT_ID_PATTERN)]
 
 
 @router.websocket("/task_monitor")
 async def tasks_monitoring(
-    websocket: WebSocket, redis_client: Annotated[Redis, Depends(get_redis)]
+    websocket: WebSocket,
+    hub: Annotated[RedisPubSubContextManagerV2, Depends(get_monitoring_hub)],
+    task_filter: Annotated[TaskFilter, Depends(get_task_filter)],
+    last_event_id: LastEventId = None,
+    batch_ms: Annotated[None | int, Query(ge=10, le=10_000)] = None,
 ) -> None:
-    """Monitor all tasks in real-time"""
-    await websocket.accept()
-
-    pubsub = redis_client.pubsub()
-    await pubsub.psubscribe("task_updates_*")
+    """
+    Monitor all tasks in real-time.
+    Filter updates server-side with ``created_by=me``, ``status`` and
+    ``task_type``, the last two may be repeated to accept several values.
+    Pass the ``event_id`` of the last update seen to replay the missed ones first;
+    when some were lost a ``{"resync": true}`` frame follows the replay, and the
+    client should read the current state of its tasks again.
+    With ``batch_ms`` updates arrive as a JSON array per interval, holding the
+    latest update of each task.
+    """
+    manager = hub.connection_manager
+    connection = await manager.connect(
+        websocket,
+        batch_interval=batch_ms / 1000 if batch_ms else None,
+        task_filter=task_filter,
+    )
 
     try:
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                data = json.loads(message["data"])
-                await websocket.send_text(json.dumps(data))
+        replay = await read_task_events(hub.redis_conn, last_event_id)
+        messages = replay.events
+        if not task_filter.is_empty:
+            messages = [m for m in messages if task_filter.matches(m.data)]
+        if not replay.complete:
+            messages.append(replay.resync_message())
+        await connection.start(messages, after=last_event_id)
+        # Updates are pushed by the hub; client messages only answer pings
+        await receive_pongs(websocket, connection)
     except WebSocketDisconnect:
-        await pubsub.punsubscribe("task_updates_*")
         logger.info("Client disconnected from tasks monitoring")
+    finally:
+        manager.disconnect(websocket)
 
 
 @router.websocket("/task_monitor/{task_id}")
 async def single_task_monitoring(
     task_id: str,
     websocket: WebSocket,
-    redis_client: Annotated[Redis, Depends(get_redis)],
+    multiplexer: Annotated[TaskChannelMultiplexer, Depends(get_task_multiplexer)],
+    task_queue: Annotated[Queue, Depends(get_task_queue)],
+    last_event_id: LastEventId = None,
 ) -> None:
-    """Monitor a specific task in real-time"""
-    await websocket.accept()
-
-    pubsub = redis_client.pubsub()
-    await pubsub.subscribe(f"task_updates_{task_id}")
+    """
+    Monitor a specific task in real-time.
+    The first frame is the task's current state, unless the ``event_id`` of the
+    last update seen is passed, in which case the missed updates are replayed,
+    or the current state is sent again if some of them were lost.
+    The current state is read from rq or the database once the task's
+    snapshot expired.
+    """
+    encoding = await accept_monitor(websocket)
+    connection = await multiplexer.watch(task_id, websocket, encoding)
 
     try:
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                data = json.loads(message["data"])
-                await websocket.send_text(json.dumps(data))
+        replay = await read_task_events(
+            multiplexer.redis_conn, last_event_id, task_id=task_id
+        )
+        messages = replay.events
+        if not last_event_id or not replay.complete:
+            # A new monitor, or one that lost updates, starts from the current state
+            messages = await read_task_state(
+                multiplexer.redis_conn, task_queue, task_id
+            )
+        await connection.start(messages, after=last_event_id)
+        await receive_pongs(websocket, connection)
     except WebSocketDisconnect:
-        await pubsub.unsubscribe(f"task_updates_{task_id}")
         logger.info(f"Client disconnected from monitoring task {task_id}")
+    finally:
+        await multiplexer.unwatch(task_id, connection)
+
+
+@router.get(
+    "/tasks/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def tasks_event_stream(
+    hub: Annotated[RedisPubSubContextManagerV2, Depends(get_monitoring_hub)],
+    task_filter: Annotated[TaskFilter, Depends(get_task_filter)],
+    last_event_id: Annotated[None | str, Header(pattern=EVENT_ID_PATTERN)] = None,
+) -> StreamingResponse:
+    """
+    Monitor all tasks in real-time over Server-Sent Events.
+    Takes the same filters as ``/task_monitor``; updates carry their ``event_id``
+    as the event id, so a reconnecting EventSource sends ``Last-Event-ID`` and
+    the missed updates are replayed first.
+    """
+    manager = hub.connection_manager
+    stream = EventStream()
+    connection = manager.connect_event_stream(stream, task_filter=task_filter)
+
+    async def events():
+        try:
+            replay = await read_task_events(hub.redis_conn, last_event_id)
+            for message in replay.events:
+                if task_filter.matches(message.data):
+                    yield format_event(message.raw, message.event_id)
+            if not replay.complete:
+                resync = replay.resync_message()
+                yield format_event(resync.raw, resync.event_id)
+            # Frames are written by this generator, the replay goes out first
+            await connection.start(after=replay.last_event_id)
+            async for frame in stream.frames():
+                yield frame
+        finally:
+            manager.disconnect(stream)
+            logger.info("Client disconnected from tasks event stream")
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@router.get("/stats")
+async def monitoring_stats(request: Request) -> dict:
+    """Delivery counters of the monitoring hub in this process"""
+    hub = request.app.state.monitoring_hub
+    connection_manager = hub.connection_manager
+    multiplexer = request.app.state.task_multiplexer
+    persistence = (request.app.state.stream_consumer or hub).persistence
+    heartbeat = request.app.state.heartbeat
+    return {
+        "pipeline": {
+            "latency": {name: stage.as_dict() for name, stage in hub.latency.items()},
+            "persistence_mode": settings.persistence_mode,
+            "persistence": persistence.stats(),
+        },
+        "task_monitor": {
+            "connections": len(connection_manager.active_connections),
+            "filtered_connections": len(connection_manager.subscriptions.filters),
+            **asdict(connection_manager.stats),
+        },
+        "single_task_monitor": {
+            "watched_tasks": len(multiplexer.watchers),
+            **asdict(multiplexer.stats),
+        },
+        "task_waiters": {
+            "awaited_tasks": len(hub.waiters),
+            **asdict(hub.waiters.stats),
+        },
+        "cache": {
+            "local": local_cache.stats(),
+            "functions": {name: stats.as_dict() for name, stats in cache_stats.items()},
+        },
+        "heartbeat": (
+            {"tracked_connections": len(heartbeat), **asdict(heartbeat.stats)}
+            if heartbeat
+            else None
+        ),
+    }
@@ -0,0 +1,56 @@
+import asyncio
+from typing import AsyncIterator
+
+from app.settings import settings
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(data: str, event_id: None | str = None) -> str:
+    """Frame a payload as a Server-Sent Event."""
+    lines = "".join(f"data: {line}\n" for line in data.splitlines())
+    if event_id:
+        return f"id: {event_id}\n{lines}\n"
+    return f"{lines}\n"
+
+
+class EventStream:
+    """
+    Outbound side of a Server-Sent Events response.
+
+    Stands in for the WebSocket of a monitor connection: frames are handed to
+    the response one at a time, so a slow reader holds up ``send_event`` just
+    like a slow socket holds up ``send_text``. A comment is sent when nothing
+    was written for ``keepalive`` seconds, so proxies keep the response open.
+    """
+
+    def __init__(self, keepalive: float = settings.monitor_sse_keepalive):
+        self.keepalive = keepalive
+        self.closed = False
+        self._frames: asyncio.Queue[None | str] = asyncio.Queue(maxsize=1)
+
+    async def send_event(self, data: str, event_id: None | str = None):
+        await self._frames.put(format_event(data, event_id))
+
+    async def send_text(self, data: str):
+        await self.send_event(data)
+
+    async def close(self, code: None | int = None):
+        """End the response, ``code`` is accepted for WebSocket compatibility."""
+        self.closed = True
+        try:
+            self._frames.put_nowait(None)
+        except asyncio.QueueFull:
+            # The reader stops after taking the pending frame
+            pass
+
+    async def frames(self) -> AsyncIterator[str]:
+        while not self.closed:
+            try:
+                frame = await asyncio.wait_for(self._frames.get(), self.keepalive)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if frame is None:
+                return
+            yield frame
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+
+from redis.exceptions import ResponseError
+from rq import Queue
+
+from app import serialization
+from app.domains.monitoring.messages import TaskUpdateMessage
+from app.domains.monitoring.pipeline import PersistenceStage, TaskStatusEvent
+from app.domains.task.lookup import lookup_tasks
+from app.settings import settings
+from app.tasks.common import task_snapshot_key
+
+EVENT_ID_PATTERN = r"^\d+-\d+$"
+# Stream entries read per XRANGE when replaying missed updates
+REPLAY_PAGE_SIZE = 1_000
+
+
+def parse_event_id(event_id: str) -> tuple[int, int]:
+    """Split a stream entry id into comparable ``(milliseconds, sequence)``."""
+    milliseconds, sequence = event_id.split("-")
+    return int(milliseconds), int(sequence)
+
+
+@dataclass
+class TaskEventReplay:
+    """The task updates missed by a monitor, read back from the events stream."""
+
+    events: list[TaskUpdateMessage]
+    # Id of the last entry read, whether or not it belongs to the task
+    last_event_id: None | str = None
+    # False when updates were trimmed from the stream or are past the replay
+    # limit, the monitor has to read the current state of its tasks again
+    complete: bool = True
+
+    def resync_message(self) -> TaskUpdateMessage:
+        """The frame telling a monitor that updates were lost."""
+        return TaskUpdateMessage.from_data(
+            {"resync": True, "event_id": self.last_event_id}
+        )
+
+
+async def read_task_events(
+    redis_conn,
+    after: None | str,
+    task_id: None | str = None,
+    limit: int = settings.monitor_replay_limit,
+    page_size: int = REPLAY_PAGE_SIZE,
+) -> TaskEventReplay:
+    """
+    Read the task updates appended after ``after``, paging through the stream
+    with XRANGE until its end or ``limit`` updates.
+
+    Returns the messages restricted to ``task_id`` if given, with the event id
+    embedded in each message as it is in live updates. The replay is
+    incomplete when ``after`` is older than the first entry left in the
+    capped stream, or when more than ``limit`` updates were missed.
+    """
+    replay = TaskEventReplay(events=[], last_event_id=after)
+    if after is None:
+        return replay
+
+    first_entry = await redis_conn.xrange(settings.task_events_stream, count=1)
+    if first_entry and parse_event_id(first_entry[0][0]) > parse_event_id(after):
+        replay.complete = False
+
+    while True:
+        entries = await redis_conn.xrange(
+            settings.task_events_stream,
+            min=f"({replay.last_event_id}",
+            count=page_size,
+        )
+        for event_id, fields in entries:
+            task_data = serialization.loads(fields["data"])
+            if not task_id or task_data.get("task_id") == task_id:
+                if len(replay.events) == limit:
+                    replay.complete = False
+                    return replay
+                task_data["event_id"] = event_id
+                replay.events.append(TaskUpdateMessage.from_data(task_data))
+            replay.last_event_id = event_id
+        if len(entries) < page_size:
+            return replay
+
+
+async def read_task_snapshot(redis_conn, task_id: str) -> list[TaskUpdateMessage]:
+    """
+    Read the current-state snapshot written by the last published update.
+
+    Returns it as a single message, or nothing when the task has not published
+    any update yet.
+    """
+    snapshot = await redis_conn.get(task_snapshot_key(task_id))
+    if not snapshot:
+        return []
+    return [TaskUpdateMessage(snapshot)]
+
+
+async def read_task_state(
+    redis_conn, task_queue: Queue, task_id: str
+) -> list[TaskUpdateMessage]:
+    """
+    Read the current state of a task: its snapshot, written at enqueue and by
+    every update, else its status in rq or the database once the snapshot
+    expired. Returns nothing for unknown tasks.
+    """
+    snapshot = await read_task_snapshot(redis_conn, task_id)
+    if snapshot:
+        return snapshot
+    found = await lookup_tasks([task_id], task_queue)
+    if task_id not in found:
+        return []
+    return [TaskUpdateMessage.from_data(found[task_id].model_dump(mode="json"))]
+
+
+class TaskEventStreamConsumer:
+    """
+    Feed the persistence stage from a Redis Stream consumer group.
+
+    Every replica joins the same group, so each event appended by the workers
+    is delivered to exactly one replica and written to Postgres once, however
+    many replicas run. Entries are acknowledged after their batch is flushed;
+    entries of a crashed replica are claimed by another one once they have
+    been pending for ``claim_idle_ms``.
+    """
+
+    def __init__(
+        self,
+        redis_conn,
+        persistence: PersistenceStage,
+        stream: str = settings.task_events_stream,
+        group: str = settings.task_events_group,
+        read_count: int = settings.persistence_batch_size,
+        block_ms: int = 1000,
+        claim_idle_ms: int = 60_000,
+    ):
+        self.redis_conn = redis_conn
+        self.persistence = persistence
+        self.persistence.on_flushed = self.acknowledge
+        self.stream = stream
+        self.group = group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.read_count = read_count
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.consumer_task = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def setup(self):
+        """
+        Create the consumer group, keeping it if another replica did. A new
+        group starts at the end of the stream: workers append every update
+        whatever the persistence mode, the events already in the stream were
+        persisted by the Pub/Sub hub.
+        """
+        try:
+            await self.redis_conn.xgroup_create(
+                self.stream, self.group, id="$", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def start_consuming(self):
+        """Start the persistence stage and the stream reader."""
+        self.persistence.start()
+        self.consumer_task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        self.logger.info(f"Consuming {self.stream} as {self.group}/{self.consumer}")
+        last_claim = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_claim >= self.claim_idle_ms / 1000:
+                    last_claim = time.monotonic()
+                    await self._claim_stale()
+
+                response = await self.redis_conn.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {self.stream: ">"},
+                    count=self.read_count,
+                    block=self.block_ms,
+                )
+                for _, entries in response or []:
+                    await self._submit(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception(f"Unable to read {self.stream}")
+                await asyncio.sleep(1)
+
+    async def _claim_stale(self):
+        """Take over entries left pending by a consumer that went away."""
+        start_id = "0-0"
+        while True:
+            start_id, entries, *_ = await self.redis_conn.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer,
+                min_idle_time=self.claim_idle_ms,
+                start_id=start_id,
+                count=self.read_count,
+            )
+            await self._submit(entries)
+            if start_id == "0-0":
+                return
+
+    async def _submit(self, entries: list):
+        for entry_id, fields in entries:
+            if fields is None:
+                # Deleted from the stream while pending, claimed as nil by Redis 6.2
+                await self.redis_conn.xack(self.stream, self.group, entry_id)
+                continue
+            task_data = serialization.loads(fields["data"])
+            task_id = task_data.get("task_id")
+            status = task_data.get("status")
+            if not task_id or not status:
+                self.logger.error(f"Unable to parse stream entry {entry_id}: {fields}")
+                await self.redis_conn.xack(self.stream, self.group, entry_id)
+                continue
+
+            await self.persistence.submit(
+                TaskStatusEvent(
+                    task_id=task_id,
+                    status=status,
+                    result=task_data.get("result"),
+                    stream_id=entry_id,
+                )
+            )
+
+    async def acknowledge(self, batch: list[TaskStatusEvent]):
+        entry_ids = [event.stream_id for event in batch if event.stream_id]
+        if entry_ids:
+            await self.redis_conn.xack(self.stream, self.group, *entry_ids)
+
+    async def cleanup(self):
+        """Stop reading, then flush and acknowledge what was already read."""
+        if self.consumer_task:
+            self.consumer_task.cancel()
+            try:
+                await self.consumer_task
+            except asyncio.CancelledError:
+                self.logger.info("Consumer task cancelled.")
+
+        await self.persistence.stop()
@@ -0,0 +1,59 @@
+import asyncio
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+
+@dataclass
+class WaiterStats:
+    resolved_tasks: int = 0
+
+
+class TaskWaiters:
+    """
+    Completion futures of the tasks awaited by long-poll requests.
+
+    All the requests waiting on a task share one future, which the monitoring
+    hub resolves with the task update once the task reaches a terminal status.
+    A resolved future is kept while anyone still waits on the task, so a late
+    waiter returns at once; the future is dropped with its last waiter.
+    """
+
+    def __init__(self):
+        self.stats = WaiterStats()
+        self._futures: dict[str, asyncio.Future] = {}
+        self._waiters: Counter[str] = Counter()
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    @contextmanager
+    def waiting(self, task_ids: Iterable[str]) -> Iterator[dict[str, asyncio.Future]]:
+        """
+        Register as a waiter of ``task_ids`` and yield their futures.
+        Enter before reading the current statuses, so no update is missed.
+        """
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for task_id in dict.fromkeys(task_ids):
+            future = self._futures.get(task_id)
+            if future is None:
+                future = self._futures[task_id] = loop.create_future()
+            self._waiters[task_id] += 1
+            futures[task_id] = future
+        try:
+            yield futures
+        finally:
+            for task_id in futures:
+                self._waiters[task_id] -= 1
+                if not self._waiters[task_id]:
+                    del self._waiters[task_id]
+                    del self._futures[task_id]
+
+    def resolve(self, task_id: str, task_data: dict):
+        """Wake up the waiters of a task that reached a terminal status."""
+        future = self._futures.get(task_id)
+        if future is not None and not future.done():
+            future.set_result(task_data)
+            self.stats.resolved_tasks += 1
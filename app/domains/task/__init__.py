@@ -1,10 +1,21 @@
 from app.domains.task.entities import (
     Task,
     TaskApiResponse,
+    TaskBatchApiResponse,
+    TaskBatchCreate,
+    TaskBulkApiResponse,
     TaskCancelledApiResponse,
     TaskCreate,
     TaskResult,
     TaskResultCreate,
+    TaskSpec,
     TaskUpdate,
+    TaskWithResult,
+)
+from app.domains.task.enums import (
+    RQ_TASK_STATUSES,
+    TERMINAL_TASK_STATUSES,
+    TaskStatus,
+    TaskType,
+    TaskWaitMode,
 )
-from app.domains.task.enums import TaskStatus, TaskType
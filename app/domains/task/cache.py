@@ -0,0 +1,61 @@
+"""
+Cache of task statuses, shared by the task routes and the workers.
+
+Workers write the entry of a task with every status they publish, and the
+monitoring hub of each replica replaces its in-process copy as the update
+passes through, so entries are current and can outlive a status poll.
+"""
+
+from app import serialization
+from app.cache import local_cache
+from app.domains.task.enums import TERMINAL_TASK_STATUSES
+from app.redis import known_cache_version, make_cache_key
+
+TASK_STATUS_CACHE_NAMESPACE = "task_status"
+TASK_STATUS_CACHE_TTL = 60
+# Terminal statuses never change, their entries only expire to free memory
+TERMINAL_TASK_STATUS_CACHE_TTL = 3_600
+# Entries are kept this much longer in Redis, served while refreshed
+TASK_STATUS_STALE_TTL = 10
+
+
+def task_status_cache_key(task_id: str, version: int) -> str:
+    """The key ``get_task_status`` caches the status of a task under."""
+    return make_cache_key(TASK_STATUS_CACHE_NAMESPACE, version, {"task_id": task_id})
+
+
+def task_status_cache_ttl(task: dict) -> int:
+    if task.get("status") in TERMINAL_TASK_STATUSES:
+        return TERMINAL_TASK_STATUS_CACHE_TTL
+    return TASK_STATUS_CACHE_TTL
+
+
+def task_status_cache_expiry(task: dict) -> int:
+    """
+    Redis expiry of an entry, as ``cached`` sets it: past its ttl, its last
+    ``TASK_STATUS_STALE_TTL`` seconds are served stale while refreshed.
+    """
+    return task_status_cache_ttl(task) + TASK_STATUS_STALE_TTL
+
+
+def task_status_cache_entry(task_id: str, status: str, result=None) -> dict:
+    """A task status as ``get_task_status`` returns and caches it."""
+    return {"task_id": task_id, "status": status, "result": result or {}}
+
+
+def refresh_cached_task_status(task_data: dict):
+    """
+    Replace the in-process entry of a task with its published update. Entries
+    are only replaced, tasks nobody asked about don't push hot ones out.
+    """
+    version = known_cache_version(TASK_STATUS_CACHE_NAMESPACE)
+    if version is None:
+        return
+    entry = task_status_cache_entry(
+        task_data["task_id"], task_data["status"], task_data.get("result")
+    )
+    local_cache.replace(
+        task_status_cache_key(entry["task_id"], version),
+        serialization.dumps(entry),
+        task_status_cache_ttl(entry),
+    )
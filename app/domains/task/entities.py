@@ -1,8 +1,9 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.domains.task.enums import TaskStatus, TaskType
+from app.settings import settings
 
 
 class Task(BaseModel):
@@ -11,6 +12,10 @@ class Task(BaseModel):
     task_type: TaskType
 
 
+class TaskWithResult(Task):
+    result: None | dict = None
+
+
 class TaskCreate(BaseModel):
     id: str
     created_by: None | str = None
@@ -19,6 +24,14 @@ class TaskCreate(BaseModel):
     task_type: TaskType
 
 
+class TaskSpec(BaseModel):
+    task_type: TaskType
+
+
+class TaskBatchCreate(BaseModel):
+    tasks: list[TaskSpec] = Field(min_length=1, max_length=settings.task_batch_max_size)
+
+
 class TaskUpdate(BaseModel):
     id: str
     status: TaskStatus
@@ -44,5 +57,14 @@ class TaskApiResponse(BaseModel):
     result: None | dict = None
 
 
+class TaskBulkApiResponse(BaseModel):
+    tasks: list[TaskApiResponse]
+    not_found: list[str]
+
+
+class TaskBatchApiResponse(BaseModel):
+    task_ids: list[str]
+
+
 class TaskCancelledApiResponse(BaseModel):
     message: str = "Task {task_id} cancelled"
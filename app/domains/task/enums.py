@@ -15,3 +15,28 @@ class TaskStatus(StrEnum):
 
 class TaskType(StrEnum):
     SAMPLE = "sample"
+
+
+class TaskWaitMode(StrEnum):
+    ANY = "any"
+    ALL = "all"
+
+
+# Statuses a task never leaves
+TERMINAL_TASK_STATUSES = frozenset(
+    {TaskStatus.FINISHED, TaskStatus.FAILED, TaskStatus.CANCELLED}
+)
+
+
+# rq statuses by the task status they are reported as, rq spells "canceled"
+# and a stopped job never finishes
+RQ_TASK_STATUSES = {
+    JobStatus.QUEUED: TaskStatus.QUEUED,
+    JobStatus.FINISHED: TaskStatus.FINISHED,
+    JobStatus.FAILED: TaskStatus.FAILED,
+    JobStatus.STARTED: TaskStatus.STARTED,
+    JobStatus.DEFERRED: TaskStatus.DEFERRED,
+    JobStatus.SCHEDULED: TaskStatus.SCHEDULED,
+    JobStatus.STOPPED: TaskStatus.FAILED,
+    JobStatus.CANCELED: TaskStatus.CANCELLED,
+}
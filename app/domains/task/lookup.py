@@ -0,0 +1,96 @@
+"""
+Current status of tasks, read from rq while it still knows their jobs, else
+from the database.
+"""
+
+from rq import Queue
+from rq.job import Job, JobStatus
+from rq.results import Result
+
+from app.domains.task import RQ_TASK_STATUSES, TaskApiResponse
+from app.redis import run_task_queue_call
+from app.repositories.task import set_up_task_repository
+
+
+def fetch_live_task(task_queue: Queue, task_id: str) -> None | TaskApiResponse:
+    """The status of a task still known to rq, ``None`` once its job expired."""
+    job = task_queue.fetch_job(task_id)
+    if not job:
+        return None
+    return TaskApiResponse(
+        task_id=task_id,
+        status=RQ_TASK_STATUSES[job.get_status()],
+        result=job.return_value() or {},
+    )
+
+
+def fetch_live_tasks(task_queue: Queue, task_ids: list[str]) -> list[TaskApiResponse]:
+    """
+    Resolve the tasks still known to rq: the jobs in one pipelined
+    ``Job.fetch_many``, then the results of the finished ones in one more.
+    """
+    connection = task_queue.connection
+    jobs = [
+        job
+        for job in Job.fetch_many(
+            task_ids, connection=connection, serializer=task_queue.serializer
+        )
+        if job
+    ]
+    results = {}
+    finished = [
+        job
+        for job in jobs
+        if job.get_status(refresh=False) == JobStatus.FINISHED
+        and job.supports_redis_streams
+    ]
+    if finished:
+        with connection.pipeline() as pipe:
+            for job in finished:
+                pipe.xrevrange(Result.get_key(job.id), "+", "-", count=1)
+            responses = pipe.execute()
+        for job, response in zip(finished, responses):
+            if not response:
+                continue
+            result_id, payload = response[0]
+            result = Result.restore(
+                job.id,
+                result_id.decode(),
+                payload,
+                connection=connection,
+                serializer=task_queue.serializer,
+            )
+            if result.type == Result.Type.SUCCESSFUL:
+                results[job.id] = result.return_value
+
+    return [
+        TaskApiResponse(
+            task_id=job.id,
+            status=RQ_TASK_STATUSES[job.get_status(refresh=False)],
+            result=(
+                results.get(job.id)
+                if job.supports_redis_streams
+                else job.return_value()
+            )
+            or {},
+        )
+        for job in jobs
+    ]
+
+
+async def lookup_tasks(
+    task_ids: list[str], task_queue: Queue
+) -> dict[str, TaskApiResponse]:
+    """The current status of tasks, from rq while it knows them, else the database."""
+    found = {
+        task.task_id: task
+        for task in await run_task_queue_call(fetch_live_tasks, task_queue, task_ids)
+    }
+    missing = [task_id for task_id in task_ids if task_id not in found]
+    if missing:
+        async with set_up_task_repository() as repo:
+            for task in await repo.get_many_with_results(missing):
+                found[task.id] = TaskApiResponse(
+                    task_id=task.id, status=task.status, result=task.result
+                )
+    return found
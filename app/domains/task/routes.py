@@ -1,29 +1,172 @@
+import asyncio
+import logging
+import uuid
 from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError, WatchError
 from rq import Queue
 from rq.exceptions import InvalidJobOperation
 
 from app.auth import get_current_user
+from app.cache import local_cache
+from app.domains.monitoring.manager import RedisPubSubContextManagerV2
+from app.domains.monitoring.routes import get_monitoring_hub
 from app.domains.task import (
+    TERMINAL_TASK_STATUSES,
     Task,
     TaskApiResponse,
+    TaskBatchApiResponse,
+    TaskBatchCreate,
+    TaskBulkApiResponse,
     TaskCancelledApiResponse,
     TaskCreate,
     TaskStatus,
     TaskType,
     TaskUpdate,
+    TaskWaitMode,
 )
+from app.domains.task.cache import (
+    TASK_STATUS_CACHE_NAMESPACE,
+    TASK_STATUS_STALE_TTL,
+    refresh_cached_task_status,
+    task_status_cache_expiry,
+    task_status_cache_key,
+    task_status_cache_ttl,
+)
+from app.domains.task.lookup import fetch_live_task, lookup_tasks
 from app.domains.user import User
-from app.redis import cached, get_task_queue
+from app.redis import (
+    cached,
+    get_cache_version,
+    get_shared_redis,
+    get_task_queue,
+    run_task_queue_call,
+)
 from app.repositories.exceptions import NotFoundException
 from app.repositories.task import set_up_task_repository
 from app.repositories.task_result import set_up_task_result_repository
+from app.settings import settings
 from app.tasks import TASK_TYPE_MAP
+from app.tasks.common import _publish_status, write_queued_snapshots
+
+TASK_STATUS_LOCK_TIMEOUT = 5
+TASK_STATUS_NEGATIVE_TTL = 5
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+
+def _cancel_job(task_queue: Queue, task_id: str) -> None | dict:
+    """Cancel the job of a task and return its meta, ``None`` if rq does not know it."""
+    job = task_queue.fetch_job(task_id)
+    if not job:
+        return None
+    job.cancel()
+    return job.meta
+
+
+async def _wait_for_tasks(
+    task_ids: list[str],
+    task_queue: Queue,
+    hub: RedisPubSubContextManagerV2,
+    timeout: float,
+    mode: TaskWaitMode,
+) -> dict[str, TaskApiResponse]:
+    """
+    Wait until any or all of the known tasks reach a terminal status, or for
+    ``timeout`` seconds, and return the latest status of each known task.
+    """
+    with hub.waiters.waiting(task_ids) as futures:
+        found = await lookup_tasks(task_ids, task_queue)
+        pending = [
+            futures[task_id]
+            for task_id, task in found.items()
+            if task.status not in TERMINAL_TASK_STATUSES
+        ]
+        if pending and (mode == TaskWaitMode.ALL or len(pending) == len(found)):
+            await asyncio.wait(
+                pending,
+                timeout=timeout,
+                return_when=(
+                    asyncio.FIRST_COMPLETED
+                    if mode == TaskWaitMode.ANY
+                    else asyncio.ALL_COMPLETED
+                ),
+            )
+
+        unresolved = []
+        for task_id in found:
+            future = futures[task_id]
+            if future.done():
+                task_data = future.result()
+                found[task_id] = TaskApiResponse(
+                    task_id=task_id,
+                    status=task_data["status"],
+                    result=task_data.get("result") or {},
+                )
+            elif found[task_id].status not in TERMINAL_TASK_STATUSES:
+                unresolved.append(task_id)
+
+    # An update published between the lookup and the subscription is only seen
+    # by reading the status again
+    if unresolved and pending:
+        found.update(await lookup_tasks(unresolved, task_queue))
+    return found
+
+
+async def _cache_task_statuses(
+    redis_connection: AsyncRedis,
+    keys: dict[str, str],
+    tasks: dict[str, TaskApiResponse],
+    stale: dict[str, str],
+):
+    """
+    Cache resolved statuses as ``cached`` does: missing entries are only added
+    and ``stale`` ones only replaced while unchanged, so a status published
+    meanwhile is kept.
+    """
+    payloads = {
+        task_id: (task.model_dump_json(), task_status_cache_expiry(task.model_dump()))
+        for task_id, task in tasks.items()
+    }
+    added = [task_id for task_id in payloads if task_id not in stale]
+    if added:
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            for task_id in added:
+                payload, expiry = payloads[task_id]
+                pipe.set(keys[task_id], payload, ex=expiry, nx=True)
+            await pipe.execute()
+
+    replaced = [task_id for task_id in payloads if task_id in stale]
+    if not replaced:
+        return
+    async with redis_connection.pipeline() as pipe:
+        try:
+            await pipe.watch(*(keys[task_id] for task_id in replaced))
+            current = await pipe.mget([keys[task_id] for task_id in replaced])
+            if current != [stale[task_id] for task_id in replaced]:
+                return
+            pipe.multi()
+            for task_id in replaced:
+                payload, expiry = payloads[task_id]
+                pipe.set(keys[task_id], payload, ex=expiry)
+            await pipe.execute()
+        except WatchError:
+            # Statuses were published meanwhile, they are kept
+            return
+
+
+async def _snapshot_queued_tasks(tasks: dict[str, dict]):
+    """Write the snapshots of enqueued tasks, monitors fall back to rq without them."""
+    try:
+        await write_queued_snapshots(get_shared_redis(), tasks)
+    except RedisError as e:
+        logger.error(f"Unable to write the snapshots of tasks {list(tasks)}: {e}")
+
 
 @router.post(
     "/",
@@ -38,7 +181,12 @@ async def create_task(
 ) -> Task:
     task_func = TASK_TYPE_MAP.get(task_type)
     if task_func:
-        job = task_queue.enqueue(task_func, 100)
+        job = await run_task_queue_call(
+            task_queue.enqueue,
+            task_func,
+            100,
+            meta={"created_by": current_user.id, "task_type": task_type},
+        )
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Task type not supported"
@@ -53,23 +201,233 @@ async def create_task(
     )
     async with set_up_task_repository() as repo:
         task_created = await repo.add(task_data)
+    await _snapshot_queued_tasks({job.id: job.meta})
 
     return task_created
 
 
+@router.post(
+    "/batch",
+    tags=["tasks"],
+    response_model=TaskBatchApiResponse,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"detail": "Task type not supported"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"detail": "Tasks could not be enqueued"},
+    },
+)
+async def create_tasks(
+    batch: TaskBatchCreate,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_queue: Annotated[Queue, Depends(get_task_queue)],
+) -> TaskBatchApiResponse:
+    """
+    Submit many tasks with one multi-row INSERT and one Redis round trip.
+
+    The batch is all or nothing. Tasks are first inserted as queued in a single
+    transaction, so workers never report on a task without its row; if that
+    fails nothing is enqueued. The jobs are then enqueued in one MULTI/EXEC
+    pipeline; if that fails the inserted tasks are marked failed and 503 is
+    returned, so no task stays queued without its job.
+    """
+    if any(spec.task_type not in TASK_TYPE_MAP for spec in batch.tasks):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Task type not supported"
+        )
+
+    tasks = [
+        TaskCreate(
+            id=str(uuid.uuid4()),
+            created_by=current_user.id,
+            updated_by=current_user.id,
+            task_type=spec.task_type,
+            status=TaskStatus.QUEUED,
+        )
+        for spec in batch.tasks
+    ]
+    async with set_up_task_repository() as repo:
+        await repo.add_many(tasks)
+
+    metas = {
+        task.id: {"created_by": current_user.id, "task_type": task.task_type}
+        for task in tasks
+    }
+    try:
+        await run_task_queue_call(
+            task_queue.enqueue_many,
+            [
+                Queue.prepare_data(
+                    TASK_TYPE_MAP[task.task_type],
+                    (100,),
+                    job_id=task.id,
+                    meta=metas[task.id],
+                )
+                for task in tasks
+            ],
+        )
+    except RedisError:
+        async with set_up_task_repository() as repo:
+            await repo.update_statuses(
+                [TaskUpdate(id=task.id, status=TaskStatus.FAILED) for task in tasks]
+            )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tasks could not be enqueued",
+        )
+
+    await _snapshot_queued_tasks(metas)
+
+    return TaskBatchApiResponse(task_ids=[task.id for task in tasks])
+
+
+@router.get(
+    "/",
+    tags=["tasks"],
+    response_model=TaskBulkApiResponse,
+)
+async def get_task_statuses(
+    ids: Annotated[
+        list[str], Query(min_length=1, max_length=settings.task_batch_max_size)
+    ],
+    task_queue: Annotated[Queue, Depends(get_task_queue)],
+) -> TaskBulkApiResponse:
+    """
+    Resolve the status of many tasks, ``?ids=<id>&ids=<id>...``.
+
+    Each source is asked once for all the ids the previous ones missed: the
+    in-process cache, the result cache with one MGET, rq with pipelined job and
+    result fetches, then the database with one joined query. Unknown ids are
+    listed in ``not_found``. Stale cache entries are read again and replaced.
+    The caches fail open, an unavailable Redis only sends every id on to rq
+    and the database.
+    """
+    task_ids = list(dict.fromkeys(ids))
+    found: dict[str, TaskApiResponse] = {}
+
+    version = await get_cache_version(TASK_STATUS_CACHE_NAMESPACE)
+    keys = {task_id: task_status_cache_key(task_id, version) for task_id in task_ids}
+    for task_id, key in keys.items():
+        cached_hit = local_cache.get(key)
+        if cached_hit:
+            found[task_id] = TaskApiResponse.model_validate_json(cached_hit)
+
+    redis_connection = get_shared_redis()
+    # Redis hits past their ttl, read again as ``cached`` would refresh them
+    stale: dict[str, str] = {}
+    uncached = [task_id for task_id in task_ids if task_id not in found]
+    if uncached:
+        try:
+            async with redis_connection.pipeline(transaction=False) as pipe:
+                pipe.mget([keys[task_id] for task_id in uncached])
+                for task_id in uncached:
+                    pipe.pttl(keys[task_id])
+                cached_hits, *expires_in_ms = await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Unable to read task statuses from the cache: {e}")
+            cached_hits = expires_in_ms = []
+        for task_id, cached_hit, expires_in in zip(
+            uncached, cached_hits, expires_in_ms
+        ):
+            if not cached_hit:
+                continue
+            if 0 < expires_in <= TASK_STATUS_STALE_TTL * 1000:
+                stale[task_id] = cached_hit
+            else:
+                found[task_id] = TaskApiResponse.model_validate_json(cached_hit)
+
+    resolved = {}
+    missing = [task_id for task_id in task_ids if task_id not in found]
+    if missing:
+        resolved = await lookup_tasks(missing, task_queue)
+
+    if resolved:
+        try:
+            await _cache_task_statuses(redis_connection, keys, resolved, stale)
+        except RedisError as e:
+            logger.error(f"Unable to cache task statuses: {e}")
+    found.update(resolved)
+    for task_id, cached_hit in stale.items():
+        if task_id not in found:
+            found[task_id] = TaskApiResponse.model_validate_json(cached_hit)
+
+    return TaskBulkApiResponse(
+        tasks=[found[task_id] for task_id in task_ids if task_id in found],
+        not_found=[task_id for task_id in task_ids if task_id not in found],
+    )
+
+
+@router.get(
+    "/wait",
+    tags=["tasks"],
+    response_model=TaskBulkApiResponse,
+)
+async def wait_for_tasks(
+    ids: Annotated[
+        list[str], Query(min_length=1, max_length=settings.task_batch_max_size)
+    ],
+    task_queue: Annotated[Queue, Depends(get_task_queue)],
+    hub: Annotated[RedisPubSubContextManagerV2, Depends(get_monitoring_hub)],
+    mode: TaskWaitMode = TaskWaitMode.ALL,
+    timeout: Annotated[float, Query(gt=0, le=settings.task_wait_max_timeout)] = 30,
+) -> TaskBulkApiResponse:
+    """
+    Long-poll many tasks, ``?ids=<id>&ids=<id>...&mode=any|all&timeout=30``.
+
+    Returns as soon as any or all of the tasks reached a terminal status, or
+    after ``timeout`` seconds, with the latest status of every task; unknown
+    ids are listed in ``not_found`` and not waited for.
+    """
+    task_ids = list(dict.fromkeys(ids))
+    found = await _wait_for_tasks(task_ids, task_queue, hub, timeout, mode)
+    return TaskBulkApiResponse(
+        tasks=[found[task_id] for task_id in task_ids if task_id in found],
+        not_found=[task_id for task_id in task_ids if task_id not in found],
+    )
+
+
+@router.get(
+    "/{task_id}/wait",
+    tags=["tasks"],
+    responses={status.HTTP_404_NOT_FOUND: {"detail": "Task not found"}},
+    response_model=TaskApiResponse,
+)
+async def wait_for_task(
+    task_id: str,
+    task_queue: Annotated[Queue, Depends(get_task_queue)],
+    hub: Annotated[RedisPubSubContextManagerV2, Depends(get_monitoring_hub)],
+    timeout: Annotated[float, Query(gt=0, le=settings.task_wait_max_timeout)] = 30,
+) -> TaskApiResponse:
+    """
+    Long-poll a task: returns as soon as it reaches a terminal status, or its
+    current status after ``timeout`` seconds.
+    """
+    found = await _wait_for_tasks([task_id], task_queue, hub, timeout, TaskWaitMode.ALL)
+    if task_id not in found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+    return found[task_id]
+
+
 @router.get(
     "/{task_id}",
     tags=["tasks"],
     responses={status.HTTP_404_NOT_FOUND: {"detail": "Task not found"}},
     response_model=TaskApiResponse,
 )
-@cached(ttl=60)
+@cached(
+    ttl=task_status_cache_ttl,
+    key_params=["task_id"],
+    namespace=TASK_STATUS_CACHE_NAMESPACE,
+    lock_timeout=TASK_STATUS_LOCK_TIMEOUT,
+    stale_ttl=TASK_STATUS_STALE_TTL,
+    negative_ttl=TASK_STATUS_NEGATIVE_TTL,
+)
 async def get_task_status(
     task_id: str,
     task_queue: Annotated[Queue, Depends(get_task_queue)],
 ) -> TaskApiResponse:
-    job = task_queue.fetch_job(task_id)
-    if not job:
+    live_task = await run_task_queue_call(fetch_live_task, task_queue, task_id)
+    if not live_task:
         async with set_up_task_repository() as repo:
             async with set_up_task_result_repository() as result_repo:
                 try:
@@ -84,13 +442,7 @@ async def get_task_status(
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND, detail=str(e)
                     )
-    res = job.return_value() or {}
-
-    return TaskApiResponse(
-        task_id=task_id,
-        status=TaskStatus(job.get_status()),
-        result=res,
-    )
+    return live_task
 
 
 @router.delete(
@@ -107,18 +459,16 @@ async def cancel_task(
     current_user: Annotated[User, Depends(get_current_user)],
     task_queue: Annotated[Queue, Depends(get_task_queue)],
 ) -> TaskCancelledApiResponse:
-    job = task_queue.fetch_job(task_id)
-    if not job:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
-        )
-
     try:
-        job.cancel()
+        meta = await run_task_queue_call(_cancel_job, task_queue, task_id)
     except InvalidJobOperation:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Task already cancelled"
         )
+    if meta is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
 
     async with set_up_task_repository() as repo:
         await repo.update(
@@ -129,4 +479,13 @@ async def cancel_task(
                 cancelled_at=datetime.now(),
             )
         )
+    # rq cancels without a status update, publish it as a worker would so the
+    # snapshot, the cache, monitors and waiters all see the task end
+    try:
+        await _publish_status(
+            get_shared_redis(), task_id, TaskStatus.CANCELLED, meta=meta
+        )
+    except RedisError as e:
+        logger.error(f"Unable to publish the cancellation of task {task_id}: {e}")
+    refresh_cached_task_status({"task_id": task_id, "status": TaskStatus.CANCELLED})
     return TaskCancelledApiResponse(message=f"Task {task_id} cancelled")
@@ -4,23 +4,58 @@ from fastapi import FastAPI
 
 from app.domains.auth import routes as auth
 from app.domains.monitoring import routes as monitoring
+from app.domains.monitoring.channels import TaskChannelLayout
+from app.domains.monitoring.enums import PersistenceMode
+from app.domains.monitoring.heartbeat import HeartbeatWheel
 from app.domains.monitoring.manager import (
+    TaskChannelMultiplexer,
     create_redis_pubsub_context_manager,
 )
+from app.domains.monitoring.pipeline import PersistenceStage
+from app.domains.monitoring.stream import TaskEventStreamConsumer
 from app.domains.task import routes as task
 from app.domains.user import routes as user
 from app.domains.worker import routes as worker
+from app.redis import close_shared_redis, close_task_queue
+from app.settings import settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis_manager = await create_redis_pubsub_context_manager("task_updates")
+    layout = TaskChannelLayout()
+    heartbeat = HeartbeatWheel() if settings.monitor_idle_timeout else None
+    redis_manager = await create_redis_pubsub_context_manager(layout, heartbeat)
+    task_multiplexer = TaskChannelMultiplexer(
+        layout, redis_manager.redis_conn, heartbeat
+    )
+    stream_consumer = None
+    if settings.persistence_mode == PersistenceMode.STREAM:
+        stream_consumer = TaskEventStreamConsumer(
+            redis_manager.redis_conn, PersistenceStage()
+        )
     try:
         await redis_manager.setup()
         await redis_manager.start_listening()
+        await task_multiplexer.start_listening()
+        if heartbeat:
+            heartbeat.start()
+        if stream_consumer:
+            await stream_consumer.setup()
+            await stream_consumer.start_consuming()
+        app.state.monitoring_hub = redis_manager
+        app.state.task_multiplexer = task_multiplexer
+        app.state.stream_consumer = stream_consumer
+        app.state.heartbeat = heartbeat
         yield
     finally:
+        if heartbeat:
+            await heartbeat.stop()
+        if stream_consumer:
+            await stream_consumer.cleanup()
+        await task_multiplexer.cleanup()
         await redis_manager.cleanup()
+        close_task_queue()
+        await close_shared_redis()
 
 
 app = FastAPI(
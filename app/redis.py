@@ -1,22 +1,49 @@
+import asyncio
 import functools
-import json
+import hashlib
+import inspect
 import logging
 import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Callable
+from typing import Any, AsyncGenerator, Callable, Sequence, TypeVar
 
-from redis import Redis
+from fastapi import HTTPException, params, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.requests import HTTPConnection
+from redis import BlockingConnectionPool, Redis
 from redis.asyncio import Redis as AsyncRedis
-from redis.exceptions import LockNotOwnedError
+from redis.exceptions import LockNotOwnedError, RedisError, WatchError
 from rq import Queue
 
+from app import serialization
+from app.cache import CacheStats, cache_stats, local_cache
 from app.settings import settings
 
 CACHE_TTL = 120
 LOCK_TIMEOUT = 300
 
+T = TypeVar("T")
+
 logger = logging.getLogger(__name__)
 
+# Event loop -> its shared client, async connections can't move across loops
+_shared_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+# Cache namespace -> (read at, version)
+_cache_versions: dict[str, tuple[float, int]] = {}
+
+# Cache key -> the call filling it, shared by the concurrent misses
+_in_flight: dict[str, asyncio.Task] = {}
+
+# Result of a call that found the entry filled by another replica
+_FILLED_ELSEWHERE = object()
+
+# Interval at which a replica waiting on another's fill checks for it
+CACHE_FILL_POLL_INTERVAL = 0.05
+
 
 @asynccontextmanager
 async def get_redis() -> AsyncGenerator[AsyncRedis, None]:
@@ -31,9 +58,49 @@ async def get_redis() -> AsyncGenerator[AsyncRedis, None]:
             await client.close()
 
 
+def create_redis_client() -> AsyncRedis:
+    """Returns a long-lived asynchronous Redis client, closed by its owner."""
+    return AsyncRedis.from_url(settings.redis_url, decode_responses=True)
+
+
+def get_shared_redis() -> AsyncRedis:
+    """
+    Returns the process-wide asynchronous client of the running event loop,
+    for hot paths that should not open a connection per call.
+    """
+    loop = asyncio.get_running_loop()
+    client = _shared_clients.get(loop)
+    if client is None:
+        client = _shared_clients[loop] = create_redis_client()
+    return client
+
+
+async def close_shared_redis():
+    """Close the shared client of the running event loop on shutdown."""
+    client = _shared_clients.pop(asyncio.get_running_loop(), None)
+    if client:
+        await client.aclose()
+
+
+@functools.cache
+def _sync_connection_pool() -> BlockingConnectionPool:
+    # One connection per queue thread, so a thread never waits for a connection.
+    # rq stores compressed binary job data, responses must not be decoded.
+    return BlockingConnectionPool.from_url(
+        settings.redis_url, max_connections=settings.task_queue_threads
+    )
+
+
+@functools.cache
+def _task_queue_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=settings.task_queue_threads, thread_name_prefix="task_queue"
+    )
+
+
 def get_sync_redis() -> Redis:
-    """Returns a synchronous Redis connection for use with rq."""
-    return Redis.from_url(settings.redis_url, decode_responses=True)
+    """Returns a synchronous Redis client on the process-wide pool, for use with rq."""
+    return Redis(connection_pool=_sync_connection_pool())
 
 
 def get_task_queue() -> Queue:
@@ -42,41 +109,371 @@ def get_task_queue() -> Queue:
     return Queue(settings.task_queue, connection=red_conn)
 
 
-def cached(ttl: int = CACHE_TTL):
-    """Simple decorator to cache the result of a function in Redis.
+async def run_task_queue_call(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking rq call, such as ``enqueue`` or ``fetch_job``, on the bounded
+    task queue thread pool, so a slow Redis never stalls the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _task_queue_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def close_task_queue():
+    """Release the task queue threads and connections on shutdown."""
+    if _task_queue_executor.cache_info().currsize:
+        _task_queue_executor().shutdown()
+        _task_queue_executor.cache_clear()
+    if _sync_connection_pool.cache_info().currsize:
+        _sync_connection_pool().disconnect()
+        _sync_connection_pool.cache_clear()
+
+
+def cache_version_key(namespace: str) -> str:
+    return f"{settings.cache_key}:{namespace}:version"
+
+
+def make_cache_key(namespace: str, version: int, key_params: dict) -> str:
+    """Fixed-length key of a cached result: a hash of its key parameters."""
+    digest = hashlib.blake2b(
+        serialization.dumps(jsonable_encoder(key_params)).encode(), digest_size=16
+    ).hexdigest()
+    return f"{settings.cache_key}:{namespace}:v{version}:{digest}"
+
+
+async def get_cache_version(namespace: str) -> int:
+    """
+    Current version of a cache namespace. It is read from Redis at most once
+    per ``cache_version_refresh`` seconds, other replicas see an invalidation
+    within that delay.
+    """
+    now = time.monotonic()
+    known = _cache_versions.get(namespace)
+    if known and now - known[0] < settings.cache_version_refresh:
+        return known[1]
+    try:
+        version = int(await get_shared_redis().get(cache_version_key(namespace)) or 0)
+    except RedisError as e:
+        logger.error(f"Unable to read the version of cache {namespace}: {e}")
+        return known[1] if known else 0
+    _cache_versions[namespace] = (now, version)
+    return version
+
+
+def known_cache_version(namespace: str) -> None | int:
+    """
+    Version of a cache namespace last read by this process, the one its
+    in-process entries are stored under. ``None`` if it has none.
+    """
+    known = _cache_versions.get(namespace)
+    return known[1] if known else None
+
+
+async def invalidate_cache(namespace: str) -> int:
+    """
+    Invalidate every result cached in a namespace in O(1), by moving it to a
+    new version. Entries of the old versions are left to expire.
+    """
+    version = await get_shared_redis().incr(cache_version_key(namespace))
+    _cache_versions[namespace] = (time.monotonic(), version)
+    return version
+
+
+def _land_flight(key: str, flight: asyncio.Task):
+    if _in_flight.get(key) is flight:
+        del _in_flight[key]
+    if not flight.cancelled():
+        # Retrieved, even if every caller went away
+        flight.exception()
+
+
+def _not_found_key(key: str) -> str:
+    return f"{key}:not_found"
+
+
+async def _wait_for_fill(
+    redis_connection: AsyncRedis,
+    key: str,
+    lock_name: str,
+    timeout: float,
+    negative: bool = False,
+) -> tuple[None | str, None | str]:
+    """
+    Wait for the replica holding the lock of a key to cache its result, or
+    with ``negative`` its 404. Returns the result and the 404, both ``None``
+    if the lock was released without either, or on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_FILL_POLL_INTERVAL)
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.exists(lock_name)
+            if negative:
+                pipe.get(_not_found_key(key))
+            payload, locked, *negatives = await pipe.execute()
+        not_found = negatives[0] if negatives else None
+        if payload is not None or not_found or not locked:
+            return payload, not_found
+    return None, None
+
+
+def _cached_result(stats: CacheStats, payload: None | str, not_found: None | str):
+    """Decode a cached result, or raise the cached 404 of a missing one."""
+    if payload is not None:
+        return serialization.loads(payload)
+    stats.negative_hits += 1
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=serialization.loads(not_found)["detail"],
+    )
+
+
+async def _store_entry(
+    redis_connection: AsyncRedis,
+    key: str,
+    payload: str,
+    ttl: float,
+    replacing: None | str,
+) -> bool:
+    """
+    Write an entry unless a newer one was written meanwhile, as by a status
+    update: a missing entry is only added, and a stale one only replaced while
+    it is unchanged.
+    """
+    if replacing is None:
+        return bool(await redis_connection.set(key, payload, ex=ttl, nx=True))
+    async with redis_connection.pipeline() as pipe:
+        try:
+            await pipe.watch(key)
+            if await pipe.get(key) != replacing:
+                return False
+            pipe.multi()
+            pipe.set(key, payload, ex=ttl)
+            await pipe.execute()
+        except WatchError:
+            return False
+    return True
+
+
+def _is_injected(parameter: inspect.Parameter) -> bool:
+    """Whether FastAPI provides the argument, rather than the request data."""
+    metadata = getattr(parameter.annotation, "__metadata__", ())
+    if any(isinstance(m, params.Depends) for m in (*metadata, parameter.default)):
+        return True
+    annotation = getattr(parameter.annotation, "__origin__", parameter.annotation)
+    return isinstance(annotation, type) and issubclass(annotation, HTTPConnection)
+
+
+def cached(
+    ttl: int | Callable[[Any], int] = CACHE_TTL,
+    key_params: None | Sequence[str] = None,
+    namespace: None | str = None,
+    lock_timeout: None | float = None,
+    stale_ttl: float = 0,
+    negative_ttl: None | float = None,
+):
+    """Decorator caching the result of a function in memory and in Redis.
+
+    Results are looked up in the in-process LRU cache, then in Redis, and
+    stored in both on a miss. A result taken from Redis is kept in memory for
+    the time its Redis key has left to live, so it never outlives ``ttl``.
+    Redis errors are logged and the function is called, the cache fails open.
+
+    Keys hash the key parameters of the call, by default every parameter that
+    is not dependency-injected, under a versioned namespace which
+    ``invalidate_cache`` moves to a new version.
+
+    Concurrent misses of a key in a process share one call of the function.
+    With ``lock_timeout``, a replica computes a missing result under a Redis
+    lock held for at most that long, the others wait for it to be cached.
+
+    With ``stale_ttl``, entries are kept that much longer than ``ttl`` and,
+    once past ``ttl``, served as they are while one background call refreshes
+    them. That call gets the arguments of the request that found the entry
+    stale, after its response: it must not use dependencies closed with it.
+    With ``negative_ttl``, an ``HTTPException`` 404 is cached for that long and
+    raised again.
     Args:
         ttl (int): The time-to-live (TTL) for the cache key. Default is 120 seconds.
+            A function of the JSON-encoded result picks the TTL of each entry.
+        key_params (list[str]): The parameters identifying a result.
+        namespace (str): The namespace of the keys, defaults to the function name.
+        lock_timeout (float): Lock misses across replicas for this many seconds.
+        stale_ttl (float): Serve entries this long past ``ttl`` while refreshing them.
+        negative_ttl (float): Cache 404 errors for this many seconds.
     Usage:
         @router.get("/items/{item_id}")\n
-        @cached(ttl=60)\n
-        async def read_item(item_id: int):
+        @cached(ttl=60, key_params=["item_id"])\n
+        async def read_item(item_id: int, db: Annotated[DB, Depends(get_db)]):
             ...
 
     """
 
     def decorator(func: Callable):
+        signature = inspect.signature(func)
+        if key_params is None:
+            key_names = [
+                name
+                for name, parameter in signature.parameters.items()
+                if not _is_injected(parameter)
+            ]
+        else:
+            unknown = set(key_params) - set(signature.parameters)
+            if unknown:
+                raise ValueError(f"{func.__name__} has no parameters {unknown}")
+            key_names = list(key_params)
+        cache_namespace = namespace or func.__name__
+        stats = cache_stats.setdefault(cache_namespace, CacheStats())
+
+        async def call(
+            key: str,
+            redis_connection: AsyncRedis,
+            args,
+            kwargs,
+            stale: None | str = None,
+        ):
+            """Call the function and cache its result, refreshing ``stale``."""
+            if stale is None:
+                stats.misses += 1
+                logger.debug(f"Cache miss for {key}")
+            else:
+                stats.refreshes += 1
+            try:
+                result = await func(*args, **kwargs)
+            except HTTPException as e:
+                if negative_ttl and e.status_code == status.HTTP_404_NOT_FOUND:
+                    payload = serialization.dumps({"detail": e.detail})
+                    local_cache.set(_not_found_key(key), payload, negative_ttl)
+                    try:
+                        await redis_connection.set(
+                            _not_found_key(key), payload, ex=negative_ttl
+                        )
+                    except RedisError as redis_error:
+                        logger.error(
+                            f"Unable to write {key} to the cache: {redis_error}"
+                        )
+                raise
+            encoded = jsonable_encoder(result)
+            payload = serialization.dumps(encoded)
+            entry_ttl = ttl(encoded) if callable(ttl) else ttl
+            try:
+                stored = await _store_entry(
+                    redis_connection, key, payload, entry_ttl + stale_ttl, stale
+                )
+            except RedisError as e:
+                logger.error(f"Unable to write {key} to the cache: {e}")
+                stored = True
+            if stored:
+                local_cache.set(key, payload, entry_ttl)
+            return result, payload
+
+        async def fill(key: str, redis_connection: AsyncRedis, args, kwargs):
+            if lock_timeout is None:
+                return await call(key, redis_connection, args, kwargs)
+
+            lock_name = f"{key}:lock"
+            # Errors raised while this caller holds the lock are its own
+            locked = False
+            try:
+                async with task_lock(
+                    redis_connection, lock_name, lock_timeout, blocking=False
+                ) as acquired:
+                    if acquired:
+                        locked = True
+                        return await call(key, redis_connection, args, kwargs)
+                payload, not_found = await _wait_for_fill(
+                    redis_connection, key, lock_name, lock_timeout, bool(negative_ttl)
+                )
+            except RedisError as e:
+                if locked:
+                    raise
+                logger.error(f"Unable to lock {key} or wait for it: {e}")
+                payload = not_found = None
+            if payload is None and not not_found:
+                return await call(key, redis_connection, args, kwargs)
+            stats.lock_waits += 1
+            if payload is None:
+                # The other replica did not find it either, raise its 404
+                _cached_result(stats, payload, not_found)
+            return _FILLED_ELSEWHERE, payload
+
+        def refresh(key: str, redis_connection: AsyncRedis, stale: str, args, kwargs):
+            """Recompute a stale entry in the background, once per key."""
+            if key in _in_flight:
+                return
+
+            def landed(flight: asyncio.Task):
+                if flight.cancelled() or flight.exception() is None:
+                    return
+                stats.refresh_errors += 1
+                logger.warning(f"Unable to refresh {key}: {flight.exception()!r}")
+
+            flight = _in_flight[key] = asyncio.create_task(
+                call(key, redis_connection, args, kwargs, stale=stale)
+            )
+            flight.add_done_callback(functools.partial(_land_flight, key))
+            flight.add_done_callback(landed)
+
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             if os.getenv("DISABLE_CACHE", "false").lower() == "true":
                 return await func(*args, **kwargs)
-            # Generate a unique cache key based on function name and arguments
-            func_name = func.__name__
-            key = f"{settings.cache_key}:{func_name}:{args}:{kwargs}"
-
-            async with get_redis() as redis_connection:
-                cached_hit = await redis_connection.get(key)
-                if cached_hit:
-                    print(f"Cache hit for {key}")
-                    return json.loads(cached_hit)
-
-                # Cache miss: call the function and cache the result
-                print(f"Cache miss for {key}")
-                result = await func(*args, **kwargs)
-                await redis_connection.setex(
-                    key, ttl, json.dumps(result)
-                )  # Cache result with TTL
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            key = make_cache_key(
+                cache_namespace,
+                await get_cache_version(cache_namespace),
+                {name: bound.arguments.get(name) for name in key_names},
+            )
+
+            cached_hit = local_cache.get(key)
+            not_found = local_cache.get(_not_found_key(key)) if negative_ttl else None
+            if cached_hit is not None or not_found:
+                stats.local_hits += 1
+                return _cached_result(stats, cached_hit, not_found)
+
+            redis_connection = get_shared_redis()
+            try:
+                async with redis_connection.pipeline(transaction=False) as pipe:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                    if negative_ttl:
+                        pipe.get(_not_found_key(key))
+                    cached_hit, expires_in_ms, *negative = await pipe.execute()
+                not_found = negative[0] if negative else None
+            except RedisError as e:
+                logger.error(f"Unable to read {key} from the cache: {e}")
+                cached_hit = not_found = None
+            if cached_hit is not None or not_found:
+                stats.redis_hits += 1
+                if cached_hit is not None and expires_in_ms > 0:
+                    fresh_for = expires_in_ms / 1000 - stale_ttl
+                    if fresh_for > 0:
+                        local_cache.set(key, cached_hit, fresh_for)
+                    else:
+                        stats.stale_hits += 1
+                        refresh(key, redis_connection, cached_hit, args, kwargs)
+                return _cached_result(stats, cached_hit, not_found)
+
+            # Concurrent misses share one call; it runs in its own task, so a
+            # caller going away does not cancel it for the others
+            flight = _in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _in_flight[key] = asyncio.create_task(
+                    fill(key, redis_connection, args, kwargs)
+                )
+                flight.add_done_callback(functools.partial(_land_flight, key))
+            else:
+                stats.coalesced += 1
+            result, payload = await asyncio.shield(flight)
+            if leader and result is not _FILLED_ELSEWHERE:
                 return result
+            return serialization.loads(payload)
 
+        wrapper.cache_namespace = cache_namespace
         return wrapper
 
     return decorator
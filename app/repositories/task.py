@@ -1,15 +1,16 @@
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
-from sqlalchemy import update
+import sqlalchemy as sa
+from sqlalchemy import column, update, values
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.database import get_async_session
-from app.domains.task import Task, TaskCreate, TaskUpdate
-from app.models.task import TaskORM
+from app.domains.task import Task, TaskCreate, TaskUpdate, TaskWithResult
+from app.models.task import TaskORM, TaskResultORM
 from app.repositories.exceptions import NotFoundException, RepositoryException
 
 
@@ -38,6 +39,19 @@ class TaskRepository:
 
         return created_task
 
+    async def add_many(self, tasks: list[TaskCreate]) -> int:
+        """Insert many tasks with a single multi-row ``INSERT``."""
+        statement = insert(self._model.__table__).values(
+            [task.dict() for task in tasks]
+        )
+        try:
+            result = await self._session.execute(statement)
+            await self._session.commit()
+        except SQLAlchemyError as exc:
+            raise RepositoryException from exc
+
+        return result.rowcount
+
     async def get(self, task_id: str) -> Task:
         statement = select(self._model).where(self._model.id == task_id)
         try:
@@ -50,6 +64,30 @@ class TaskRepository:
 
         return Task.model_validate(result.__dict__)
 
+    async def get_many_with_results(self, task_ids: list[str]) -> list[TaskWithResult]:
+        """
+        Load many tasks with their result in one joined ``WHERE id IN (...)``
+        query, ids without a task are left out.
+        """
+        statement = (
+            select(
+                self._model.id,
+                self._model.status,
+                self._model.task_type,
+                TaskResultORM.result,
+            )
+            .outerjoin(TaskResultORM, TaskResultORM.task_id == self._model.id)
+            .where(self._model.id.in_(task_ids))
+        )
+        try:
+            rows = (await self._session.execute(statement)).all()
+        except SQLAlchemyError as exc:
+            raise RepositoryException from exc
+
+        # A task may have several result rows, keep one per task
+        tasks = {row.id: TaskWithResult.model_validate(row._asdict()) for row in rows}
+        return list(tasks.values())
+
     def _map_update_data(self, data: TaskUpdate) -> dict:
         return data.dict(exclude_unset=True, exclude={"id"})
 
@@ -70,6 +108,27 @@ class TaskRepository:
 
         return updated_task
 
+    async def update_statuses(self, data: list[TaskUpdate]) -> int:
+        """Set the status of many tasks in one ``UPDATE ... FROM (VALUES ...)``."""
+        # Typed like the column, so statuses are stored as enum names as well
+        rows = values(
+            column("id", sa.String),
+            column("status", self._model.status.type),
+            name="task_status",
+        ).data([(task.id, task.status) for task in data])
+        statement = (
+            update(self._model)
+            .where(self._model.id == rows.c.id)
+            .values(status=rows.c.status)
+        )
+        try:
+            result = await self._session.execute(statement)
+            await self._session.commit()
+        except SQLAlchemyError as exc:
+            raise RepositoryException from exc
+
+        return result.rowcount
+
 
 @asynccontextmanager
 async def set_up_task_repository() -> AsyncIterator[TaskRepository]:
@@ -1,6 +1,7 @@
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
+from sqlalchemy import insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -34,6 +35,22 @@ class TaskResultRepository:
 
         return task_result
 
+    async def add_many(self, task_results: list[TaskResult]) -> list[TaskResult]:
+        """Insert many results with a single multi-row ``INSERT``."""
+        statement = insert(self._model.__table__).values(
+            [
+                {"task_id": task_result.task_id, "result": task_result.result}
+                for task_result in task_results
+            ]
+        )
+        try:
+            await self._session.execute(statement)
+            await self._session.commit()
+        except SQLAlchemyError as exc:
+            raise RepositoryException from exc
+
+        return task_results
+
     async def get(self, task_id: str) -> TaskResult:
         statement = select(self._model).where(self._model.task_id == task_id)
         try:
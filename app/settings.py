@@ -3,6 +3,8 @@ import os
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings
 
+from app.domains.monitoring.enums import ChannelLayout, OverflowPolicy, PersistenceMode
+
 
 class RedisSettingsMixin(BaseSettings):
     redis_url: str
@@ -10,6 +12,7 @@ class RedisSettingsMixin(BaseSettings):
     cache_key: str
     task_key: str
     task_queue: str
+    task_queue_threads: int = 8
 
 
 class DBSettingsMixin(BaseSettings):
@@ -17,9 +20,50 @@ class DBSettingsMixin(BaseSettings):
     sqlalchemy_async_engine_url: PostgresDsn
 
 
+class CacheSettingsMixin(BaseSettings):
+    cache_local_max_entries: int = 10_000
+    cache_local_max_bytes: int = 16 * 1024 * 1024
+    cache_version_refresh: float = 1.0
+
+
+class TaskSettingsMixin(BaseSettings):
+    task_batch_max_size: int = 1_000
+    task_wait_max_timeout: float = 60.0
+
+
+class MonitoringSettingsMixin(BaseSettings):
+    monitor_queue_size: int = 100
+    # Distinct tasks a batching monitor holds per window, each keeps one update
+    monitor_batch_max_tasks: int = 10_000
+    monitor_overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST
+    monitor_send_timeout: float = 5.0
+    persistence_workers: int = 4
+    persistence_queue_size: int = 1000
+    persistence_batch_size: int = 500
+    persistence_flush_interval_ms: int = 50
+    persistence_mode: PersistenceMode = PersistenceMode.PUBSUB
+    task_events_stream: str = "task_events"
+    task_events_stream_maxlen: int = 100_000
+    task_events_group: str = "task_persistence"
+    monitor_replay_limit: int = 10_000
+    task_snapshot_ttl: int = 86_400
+    task_channel: str = "task_updates"
+    # SHARDED needs Redis 7, neither layout supports Redis Cluster
+    task_channel_layout: ChannelLayout = ChannelLayout.PATTERN
+    task_channel_shards: int = 16
+    monitor_sse_keepalive: float = 15.0
+    monitor_deflate_level: int = 6
+    monitor_ping_interval: float = 20.0
+    monitor_idle_timeout: float = 60.0
+    monitor_heartbeat_tick: float = 1.0
+
+
 class Settings(
     DBSettingsMixin,
     RedisSettingsMixin,
+    CacheSettingsMixin,
+    TaskSettingsMixin,
+    MonitoringSettingsMixin,
 ):
     class Config:
         extra = "allow"
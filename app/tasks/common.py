@@ -1,21 +1,91 @@
 import functools
-import json
 from typing import Awaitable, Callable
 
 from redis.asyncio import Redis
 from rq import get_current_job
 
+from app import serialization
+from app.domains.monitoring.channels import TaskChannelLayout
 from app.domains.task import TaskStatus
-from app.redis import get_redis
+from app.domains.task.cache import (
+    TASK_STATUS_CACHE_NAMESPACE,
+    task_status_cache_entry,
+    task_status_cache_expiry,
+    task_status_cache_key,
+)
+from app.redis import cache_version_key, get_redis
+from app.settings import settings
 from app.tasks.exceptions import TaskException
 
+task_channels = TaskChannelLayout()
 
-async def _publish_status(redis_conn: Redis, task_id: str, status: str, result=None):
+
+def task_snapshot_key(task_id: str) -> str:
+    return f"{settings.task_key}:snapshot:{task_id}"
+
+
+def _task_data(task_id: str, status: str, result=None, meta: None | dict = None):
+    meta = meta or {}
+    return {
+        "task_id": task_id,
+        "status": status,
+        "result": result,
+        "created_by": meta.get("created_by"),
+        "task_type": meta.get("task_type"),
+    }
+
+
+async def write_queued_snapshots(redis_conn: Redis, tasks: dict[str, dict]):
+    """
+    Write the snapshot of newly enqueued tasks, by task id and job ``meta``,
+    so monitors get the state of a task before its worker publishes any.
+    A snapshot the worker already wrote is kept.
+    """
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for task_id, meta in tasks.items():
+            pipe.set(
+                task_snapshot_key(task_id),
+                serialization.dumps(_task_data(task_id, TaskStatus.QUEUED, meta=meta)),
+                ex=settings.task_snapshot_ttl,
+                nx=True,
+            )
+        await pipe.execute()
+
+
+async def _publish_status(
+    redis_conn: Redis, task_id: str, status: str, result=None, meta: None | dict = None
+):
     """
-    Publishes the status of the task to Redis Pub/Sub.
+    Appends the status of the task to the capped task events stream, then
+    publishes it to Redis Pub/Sub tagged with the stream entry id so monitors
+    can resume from the last event they have seen. The same message is kept
+    as the task's current-state snapshot, and the task's status cache entry is
+    replaced, so status polls never see an older status than monitors do.
+
+    ``created_by`` and ``task_type`` are taken from the job ``meta`` set at
+    enqueue time, monitors filter on them server-side.
     """
-    message = json.dumps({"task_id": task_id, "status": status, "result": result})
-    await redis_conn.publish(f"task_updates_{task_id}", message)
+    task_data = _task_data(task_id, status, result, meta)
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.xadd(
+            settings.task_events_stream,
+            {"data": serialization.dumps(task_data)},
+            maxlen=settings.task_events_stream_maxlen,
+            approximate=True,
+        )
+        pipe.get(cache_version_key(TASK_STATUS_CACHE_NAMESPACE))
+        event_id, cache_version = await pipe.execute()
+    message = serialization.dumps({**task_data, "event_id": event_id})
+    cache_entry = task_status_cache_entry(task_id, status, result)
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.set(task_snapshot_key(task_id), message, ex=settings.task_snapshot_ttl)
+        pipe.set(
+            task_status_cache_key(task_id, int(cache_version or 0)),
+            serialization.dumps(cache_entry),
+            ex=task_status_cache_expiry(cache_entry),
+        )
+        task_channels.publish(pipe, task_id, message)
+        await pipe.execute()
 
 
 def redis_task(task_func: Callable[..., Awaitable]):
@@ -31,14 +101,22 @@ def redis_task(task_func: Callable[..., Awaitable]):
 
         async with get_redis() as redis_conn:
             try:
-                await _publish_status(redis_conn, task_id, TaskStatus.RUNNING)
+                await _publish_status(
+                    redis_conn, task_id, TaskStatus.STARTED, meta=job.meta
+                )
 
                 result = await task_func(*args, **kwargs)
 
-                await _publish_status(redis_conn, task_id, TaskStatus.COMPLETED, result)
+                await _publish_status(
+                    redis_conn, task_id, TaskStatus.FINISHED, result, meta=job.meta
+                )
             except TaskException as e:
                 await _publish_status(
-                    redis_conn, task_id, TaskStatus.FAILED, result=str(e)
+                    redis_conn,
+                    task_id,
+                    TaskStatus.FAILED,
+                    result={"error": str(e)},
+                    meta=job.meta,
                 )
                 raise
 
@@ -0,0 +1,88 @@
+"""
+Per-message CPU cost of forwarding a task update to monitor sockets.
+
+Compares the former path, where every socket re-parsed and re-encoded the
+payload, with the passthrough path that parses once per process and forwards
+the raw payload, and the stdlib codec with orjson when it is installed.
+
+Usage:
+    python -m benchmarks.monitoring_codec --recipients 100 --messages 2000
+"""
+
+import argparse
+import json
+import time
+
+from app import serialization
+from app.domains.monitoring.messages import TaskUpdateMessage
+
+PAYLOAD = json.dumps(
+    {
+        "task_id": "0b7e2e0c-3d8a-4bd0-9d55-3f0cf2d2a5b1",
+        "status": "finished",
+        "result": {
+            "result": 42,
+            "message": "Task completed successfully after 100 seconds",
+            "items": [{"index": i, "value": i * 1.5} for i in range(20)],
+        },
+        "event_id": "1727740800000-0",
+    }
+)
+
+
+def reparse_per_recipient(recipients: int) -> None:
+    task_data = json.loads(PAYLOAD)  # hub listener
+    task_data.get("task_id")
+    for _ in range(recipients):
+        data = json.loads(PAYLOAD)
+        json.dumps(data)
+
+
+def passthrough(recipients: int) -> None:
+    message = TaskUpdateMessage(PAYLOAD)
+    message.task_id  # hub listener, parsed once
+    for _ in range(recipients):
+        message.raw
+
+
+def cpu_microseconds(func, recipients: int, messages: int) -> float:
+    started = time.process_time()
+    for _ in range(messages):
+        func(recipients)
+    return (time.process_time() - started) / messages * 1_000_000
+
+
+def codec_microseconds(loads, dumps, messages: int) -> float:
+    started = time.process_time()
+    for _ in range(messages):
+        dumps(loads(PAYLOAD))
+    return (time.process_time() - started) / messages * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recipients", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    before = cpu_microseconds(reparse_per_recipient, args.recipients, args.messages)
+    after = cpu_microseconds(passthrough, args.recipients, args.messages)
+    print(f"{args.recipients} recipients, CPU per message:")
+    print(f"  re-parse per recipient  {before:10.1f} us")
+    print(f"  parse once, passthrough {after:10.1f} us ({before / after:.0f}x)")
+
+    print("Codec round trip per message:")
+    print(
+        f"  json   {codec_microseconds(json.loads, json.dumps, args.messages):8.2f} us"
+    )
+    if serialization.orjson is not None:
+        orjson_cost = codec_microseconds(
+            serialization.loads, serialization.dumps, args.messages
+        )
+        print(f"  orjson {orjson_cost:8.2f} us")
+    else:
+        print("  orjson not installed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Load test of the monitoring WebSocket fan-out.
+
+Serves the monitoring routes in-process against fakeredis, or a throwaway
+Redis given with ``--redis-url``, connects simulated ASGI WebSocket clients to
+``/monitoring/task_monitor`` and ``/monitoring/task_monitor/{task_id}``, then
+publishes task updates through ``_publish_status`` at a fixed rate. Reports
+publish-to-delivery latency histograms, dropped messages, CPU time and RSS,
+and saves them as JSON to compare commits. Clients run in the same process,
+CPU and RSS include their share.
+
+Usage:
+    python -m benchmarks.monitoring_fanout --clients 500 --task-clients 100 \\
+        --rate 200 --duration 10 --output fanout.json
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+
+from fakeredis import FakeServer, FakeStrictRedis
+from fakeredis.aioredis import FakeRedis
+from fastapi import FastAPI
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis
+from rq import Queue
+
+from app import serialization
+from app.domains.monitoring import routes as monitoring
+from app.domains.monitoring.channels import TaskChannelLayout
+from app.domains.monitoring.manager import (
+    RedisPubSubContextManagerV2,
+    TaskChannelMultiplexer,
+    WebSocketConnectionManager,
+)
+from app.domains.task import TaskStatus
+from app.redis import get_task_queue
+from app.settings import settings
+from app.tasks.common import _publish_status, write_queued_snapshots
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+@dataclass
+class Deliveries:
+    expected: int = 0
+    latencies_ms: list[float] = field(default_factory=list)
+
+    def report(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for latency in latencies:
+            counts[bisect_left(BUCKETS_MS, latency)] += 1
+
+        def percentile(p: float) -> None | float:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+        return {
+            "expected": self.expected,
+            "delivered": len(latencies),
+            # With batch_ms, updates coalesced into a later one count as dropped
+            "dropped": self.expected - len(latencies),
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p90": percentile(0.90),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1], 3) if latencies else None,
+            },
+            "histogram_ms": {
+                **{f"<={bound}": count for bound, count in zip(BUCKETS_MS, counts)},
+                f">{BUCKETS_MS[-1]}": counts[-1],
+            },
+        }
+
+
+class SimulatedWebSocketClient:
+    """Minimal ASGI WebSocket client, records when each update arrives."""
+
+    def __init__(self, app: FastAPI, path: str, deliveries: Deliveries):
+        self.app = app
+        self.path = path
+        self.deliveries = deliveries
+        self.accepted = asyncio.Event()
+        self._disconnect = asyncio.Event()
+        self._connected = False
+        self._task = None
+
+    async def connect(self):
+        path, _, query = self.path.partition("?")
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [],
+            "subprotocols": [],
+            "client": ("benchmark", 0),
+            "server": ("benchmark", 80),
+        }
+        self._task = asyncio.create_task(self.app(scope, self._receive, self._send))
+        await self.accepted.wait()
+
+    async def _receive(self) -> dict:
+        if not self._connected:
+            self._connected = True
+            return {"type": "websocket.connect"}
+        await self._disconnect.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def _send(self, message: dict):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.send":
+            received = time.perf_counter()
+            frame = serialization.loads(message["text"])
+            for update in frame if isinstance(frame, list) else [frame]:
+                sent_at = (update.get("result") or {}).get("sent_at")
+                if sent_at is not None:
+                    self.deliveries.latencies_ms.append((received - sent_at) * 1000)
+        elif message["type"] == "websocket.close":
+            self._disconnect.set()
+
+    async def close(self):
+        self._disconnect.set()
+        if self._task:
+            await self._task
+
+
+def build_app(redis_conn, task_queue: Queue) -> FastAPI:
+    """
+    The monitoring routes with their hub, without persistence, asking
+    ``task_queue`` about tasks without a snapshot.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        layout = TaskChannelLayout()
+        hub = RedisPubSubContextManagerV2(
+            WebSocketConnectionManager(), layout, redis_conn, persistence=None
+        )
+        multiplexer = TaskChannelMultiplexer(layout, redis_conn)
+        await hub.setup()
+        await hub.start_listening()
+        await multiplexer.start_listening()
+        app.state.monitoring_hub = hub
+        app.state.task_multiplexer = multiplexer
+        app.state.stream_consumer = None
+        app.state.heartbeat = None
+        try:
+            yield
+        finally:
+            await multiplexer.cleanup()
+            await hub.cleanup()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(monitoring.router, prefix="/monitoring")
+    app.dependency_overrides[get_task_queue] = lambda: task_queue
+    return app
+
+
+def git_revision() -> None | str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    if args.redis_url:
+
+        def connect():
+            return Redis.from_url(args.redis_url, decode_responses=True)
+
+        task_queue = Queue(
+            settings.task_queue, connection=SyncRedis.from_url(args.redis_url)
+        )
+    else:
+        server = FakeServer()
+
+        def connect():
+            return FakeRedis(server=server, decode_responses=True)
+
+        task_queue = Queue(
+            settings.task_queue, connection=FakeStrictRedis(server=server)
+        )
+
+    app = build_app(connect(), task_queue)
+    publisher = connect()
+    task_ids = [f"benchmark-{index}" for index in range(args.tasks)]
+    all_tasks, single_task = Deliveries(), Deliveries()
+    # The tasks are queued, as the task routes would have left them
+    await write_queued_snapshots(publisher, {task_id: {} for task_id in task_ids})
+
+    async with app.router.lifespan_context(app):
+        query = f"?batch_ms={args.batch_ms}" if args.batch_ms else ""
+        clients = [
+            SimulatedWebSocketClient(app, f"/monitoring/task_monitor{query}", all_tasks)
+            for _ in range(args.clients)
+        ]
+        watched: dict[str, int] = {}
+        for index in range(args.task_clients):
+            task_id = task_ids[index % len(task_ids)]
+            watched[task_id] = watched.get(task_id, 0) + 1
+            clients.append(
+                SimulatedWebSocketClient(
+                    app, f"/monitoring/task_monitor/{task_id}", single_task
+                )
+            )
+        for client in clients:
+            await client.connect()
+        # Let the task channel subscriptions settle before publishing
+        await asyncio.sleep(0.5)
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        published = 0
+        interval = 1 / args.rate
+        while time.perf_counter() - started < args.duration:
+            task_id = task_ids[published % len(task_ids)]
+            status = (TaskStatus.STARTED, TaskStatus.FINISHED)[published % 2]
+            await _publish_status(
+                publisher,
+                task_id,
+                status,
+                result={"sent_at": time.perf_counter(), "payload": "x" * args.size},
+            )
+            published += 1
+            all_tasks.expected += args.clients
+            single_task.expected += watched.get(task_id, 0)
+            delay = started + published * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        publish_seconds = time.perf_counter() - started
+        await asyncio.sleep(args.drain)
+        elapsed = time.perf_counter() - started
+        cpu_seconds = time.process_time() - cpu_started
+        hub = app.state.monitoring_hub
+        server_stats = {
+            "task_monitor": asdict(hub.connection_manager.stats),
+            "single_task_monitor": asdict(app.state.task_multiplexer.stats),
+            "latency": {name: stage.as_dict() for name, stage in hub.latency.items()},
+        }
+
+        for client in clients:
+            await client.close()
+    await publisher.aclose()
+
+    return {
+        "revision": git_revision(),
+        "config": vars(args),
+        "published": published,
+        "publish_rate": round(published / publish_seconds, 1),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_utilization": round(cpu_seconds / elapsed, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "task_monitor": all_tasks.report() if args.clients else None,
+        "single_task_monitor": single_task.report() if args.task_clients else None,
+        "server": server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--task-clients", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=100, help="updates per second")
+    parser.add_argument("--duration", type=float, default=5, help="seconds")
+    parser.add_argument("--drain", type=float, default=1, help="seconds")
+    parser.add_argument("--size", type=int, default=256, help="result payload bytes")
+    parser.add_argument("--batch-ms", type=int, default=None)
+    parser.add_argument("--redis-url", default=None, help="defaults to fakeredis")
+    parser.add_argument("--output", default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import zlib
+
+import pytest
+
+from app.domains.monitoring.encoding import encode_batch, negotiate_encoding
+from app.domains.monitoring.enums import FrameEncoding
+from app.domains.monitoring.messages import TaskUpdateMessage
+
+
+def inflate(frame: bytes) -> bytes:
+    return zlib.decompress(frame, -zlib.MAX_WBITS)
+
+
+class TestFrameEncoding:
+    def test_negotiate_first_supported_subprotocol(self):
+        assert negotiate_encoding(["graphql-ws", "json+deflate", "json"]) == (
+            FrameEncoding.JSON_DEFLATE
+        )
+        assert negotiate_encoding(["graphql-ws"]) is None
+
+    def test_encoded_payload_is_cached_per_message(self):
+        message = TaskUpdateMessage('{"task_id": "1", "result": {"a": 1}}')
+
+        frame = message.encoded(FrameEncoding.JSON_DEFLATE)
+
+        assert message.encoded(FrameEncoding.JSON_DEFLATE) is frame
+        assert inflate(frame) == message.raw.encode()
+        assert message.encoded(FrameEncoding.JSON) is message.raw
+
+    def test_msgpack_batch_reuses_message_payloads(self):
+        msgpack = pytest.importorskip("msgpack")
+        messages = [TaskUpdateMessage(f'{{"task_id": "{i}"}}') for i in range(20)]
+
+        frame = encode_batch(messages, FrameEncoding.MSGPACK)
+
+        assert msgpack.unpackb(frame) == [{"task_id": str(i)} for i in range(20)]
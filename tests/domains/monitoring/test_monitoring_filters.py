@@ -0,0 +1,45 @@
+from app.domains.monitoring.filters import SubscriptionIndex, TaskFilter
+from app.domains.monitoring.messages import TaskUpdateMessage
+
+
+def update(**task_data) -> TaskUpdateMessage:
+    return TaskUpdateMessage.from_data(task_data)
+
+
+class TestSubscriptionIndex:
+    def test_match_intersects_fields(self):
+        index = SubscriptionIndex()
+        index.add("all")
+        index.add("mine", TaskFilter(created_by=frozenset({"user-1"})))
+        index.add(
+            "my_failures",
+            TaskFilter(
+                created_by=frozenset({"user-1"}), statuses=frozenset({"failed"})
+            ),
+        )
+        index.add("samples", TaskFilter(task_types=frozenset({"sample"})))
+
+        matched = index.match(
+            update(created_by="user-1", status="finished", task_type="sample")
+        )
+        assert sorted(matched) == ["all", "mine", "samples"]
+
+        matched = index.match(
+            update(created_by="user-2", status="failed", task_type="other")
+        )
+        assert matched == ["all"]
+
+    def test_discard_removes_subscriber_from_index(self):
+        index = SubscriptionIndex()
+        index.add("mine", TaskFilter(created_by=frozenset({"user-1"})))
+        index.discard("mine")
+
+        assert index.match(update(created_by="user-1")) == []
+        assert index.filters == {}
+        assert all(not buckets for buckets in index._index.values())
+
+    def test_unfiltered_match_does_not_parse(self):
+        index = SubscriptionIndex()
+        index.add("all", TaskFilter())
+
+        assert index.match(TaskUpdateMessage("not json")) == ["all"]
@@ -0,0 +1,46 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.domains.monitoring.heartbeat import PING, HeartbeatWheel
+from app.domains.monitoring.manager import MonitorConnection, MonitorStats
+
+
+def watched_connection(wheel: HeartbeatWheel) -> MonitorConnection:
+    connection = MonitorConnection(AsyncMock(), MonitorStats())
+    wheel.add(connection)
+    connection.last_seen = 0
+    return connection
+
+
+@pytest.mark.asyncio
+class TestHeartbeatWheel:
+    async def test_pings_idle_then_reaps_silent_connections(self):
+        wheel = HeartbeatWheel(ping_interval=2, idle_timeout=4, tick=1)
+        quiet, chatty = watched_connection(wheel), watched_connection(wheel)
+
+        wheel.advance(now=1)
+        wheel.advance(now=2)
+
+        assert list(quiet._pending.values()) == [PING]
+        assert wheel.stats.pings_sent == 2
+
+        chatty.last_seen = 3
+        wheel.advance(now=3)
+        wheel.advance(now=4)
+
+        assert quiet.closed
+        assert not chatty.closed
+        assert wheel.stats.reaped_connections == 1
+        assert len(wheel) == 1
+
+    async def test_discard_stops_tracking(self):
+        wheel = HeartbeatWheel(ping_interval=1, idle_timeout=2, tick=1)
+        connection = watched_connection(wheel)
+        wheel.discard(connection)
+
+        for now in range(1, 5):
+            wheel.advance(now=now)
+
+        assert not connection.closed
+        assert len(wheel) == 0
@@ -0,0 +1,260 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.domains.monitoring.channels import TaskChannelLayout
+from app.domains.monitoring.enums import ChannelLayout, OverflowPolicy
+from app.domains.monitoring.manager import (
+    MonitorConnection,
+    MonitorStats,
+    RedisPubSubContextManagerV2,
+    TaskChannelMultiplexer,
+    WebSocketConnectionManager,
+)
+from app.domains.monitoring.messages import TaskUpdateMessage
+from app.domains.monitoring.sse import EventStream
+
+PATTERN_LAYOUT = TaskChannelLayout("task_updates", ChannelLayout.PATTERN)
+
+
+def mock_websocket(subprotocols: list[str] = ()) -> AsyncMock:
+    websocket = AsyncMock()
+    websocket.scope = {"type": "websocket", "subprotocols": list(subprotocols)}
+    return websocket
+
+
+async def drain_writers():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+class TestWebSocketConnectionManager:
+    async def test_broadcast_to_all_connections(self):
+        manager = WebSocketConnectionManager()
+        websocket_1, websocket_2 = mock_websocket(), mock_websocket()
+        await (await manager.connect(websocket_1)).start()
+        await (await manager.connect(websocket_2)).start()
+
+        manager.broadcast(TaskUpdateMessage('{"task_id": "1"}'))
+        await drain_writers()
+
+        websocket_1.send_text.assert_awaited_once_with('{"task_id": "1"}')
+        websocket_2.send_text.assert_awaited_once_with('{"task_id": "1"}')
+
+    async def test_broadcast_evicts_failed_connection(self):
+        manager = WebSocketConnectionManager()
+        websocket_1, websocket_2 = mock_websocket(), mock_websocket()
+        websocket_1.send_text.side_effect = RuntimeError("closed")
+        await (await manager.connect(websocket_1)).start()
+        await (await manager.connect(websocket_2)).start()
+
+        manager.broadcast(TaskUpdateMessage('{"task_id": "1"}'))
+        await drain_writers()
+
+        assert list(manager.active_connections) == [websocket_2]
+        assert manager.stats.evicted_connections == 1
+
+    async def test_broadcast_shares_encoded_frame(self):
+        manager = WebSocketConnectionManager()
+        websocket_1 = mock_websocket(["json+deflate"])
+        websocket_2 = mock_websocket(["json+deflate"])
+        await (await manager.connect(websocket_1)).start()
+        await (await manager.connect(websocket_2)).start()
+
+        manager.broadcast(TaskUpdateMessage('{"task_id": "1"}'))
+        await drain_writers()
+
+        websocket_1.accept.assert_awaited_once_with(subprotocol="json+deflate")
+        (frame_1,) = websocket_1.send_bytes.await_args.args
+        (frame_2,) = websocket_2.send_bytes.await_args.args
+        assert frame_1 is frame_2
+
+    async def test_broadcast_to_event_stream(self):
+        manager = WebSocketConnectionManager()
+        stream = EventStream(keepalive=1)
+        await manager.connect_event_stream(stream).start()
+        frames = stream.frames()
+
+        manager.broadcast(TaskUpdateMessage('{"task_id": "1", "event_id": "1-1"}'))
+
+        assert await frames.__anext__() == (
+            'id: 1-1\ndata: {"task_id": "1", "event_id": "1-1"}\n\n'
+        )
+        manager.disconnect(stream)
+        assert manager.active_connections == {}
+
+
+class TestMonitorConnection:
+    def test_drop_oldest_on_overflow(self):
+        connection = MonitorConnection(
+            mock_websocket(),
+            MonitorStats(),
+            max_queue_size=2,
+            overflow_policy=OverflowPolicy.DROP_OLDEST,
+        )
+
+        for message in ("1", "2", "3"):
+            connection.send(TaskUpdateMessage(message))
+
+        assert [m.raw for m in connection._pending.values()] == ["2", "3"]
+        assert connection.stats.dropped_frames == 1
+
+    def test_coalesce_per_task(self):
+        connection = MonitorConnection(
+            mock_websocket(),
+            MonitorStats(),
+            max_queue_size=2,
+            overflow_policy=OverflowPolicy.COALESCE,
+        )
+
+        connection.send(TaskUpdateMessage("started"), key="1")
+        connection.send(TaskUpdateMessage("finished"), key="1")
+
+        assert [m.raw for m in connection._pending.values()] == ["finished"]
+        assert connection.stats.coalesced_frames == 1
+
+    async def test_disconnect_on_overflow(self):
+        evicted = []
+        connection = MonitorConnection(
+            mock_websocket(),
+            MonitorStats(),
+            on_evict=evicted.append,
+            max_queue_size=1,
+            overflow_policy=OverflowPolicy.DISCONNECT,
+        )
+
+        for message in ("1", "2", "3"):
+            connection.send(TaskUpdateMessage(message))
+
+        assert connection.closed
+        assert evicted == [connection]
+        assert connection.stats.evicted_connections == 1
+
+    async def test_skip_live_frames_already_replayed(self):
+        websocket = mock_websocket()
+        connection = MonitorConnection(websocket, MonitorStats())
+
+        live_1 = TaskUpdateMessage('{"event_id": "1-1", "live": true}')
+        live_2 = TaskUpdateMessage('{"event_id": "1-2", "live": true}')
+        replayed_1 = TaskUpdateMessage('{"event_id": "1-1", "live": false}')
+
+        connection.send(live_1)
+        connection.send(live_2)
+        await connection.start([replayed_1], after="1-0")
+        await drain_writers()
+
+        assert [call.args[0] for call in websocket.send_text.await_args_list] == [
+            replayed_1.raw,
+            live_2.raw,
+        ]
+
+    async def test_batch_keeps_latest_update_per_task(self):
+        websocket = mock_websocket()
+        connection = MonitorConnection(websocket, MonitorStats(), batch_interval=0.01)
+        await connection.start()
+
+        for task_id, status in (("1", "started"), ("2", "started"), ("1", "finished")):
+            connection.send(
+                TaskUpdateMessage(f'{{"task_id": "{task_id}", "status": "{status}"}}'),
+                key=task_id,
+            )
+        await asyncio.sleep(0.05)
+
+        websocket.send_text.assert_awaited_once_with(
+            '[{"task_id": "1", "status": "finished"},'
+            '{"task_id": "2", "status": "started"}]'
+        )
+
+    async def test_batch_holds_more_tasks_than_the_queue_size(self):
+        websocket = mock_websocket()
+        connection = MonitorConnection(
+            websocket, MonitorStats(), max_queue_size=100, batch_interval=0.01
+        )
+        await connection.start()
+
+        for task_id in range(1000):
+            connection.send(
+                TaskUpdateMessage(f'{{"task_id": "{task_id}", "status": "started"}}'),
+                key=str(task_id),
+            )
+        await asyncio.sleep(0.05)
+
+        (batch,) = websocket.send_text.await_args.args
+        assert len(json.loads(batch)) == 1000
+        assert connection.stats.dropped_frames == 0
+
+
+@pytest.mark.asyncio
+class TestRedisPubSubContextManager:
+    async def test_listener_survives_malformed_messages(self):
+        manager = WebSocketConnectionManager()
+        hub = RedisPubSubContextManagerV2(
+            manager, PATTERN_LAYOUT, MagicMock(), persistence=None
+        )
+        websocket = mock_websocket()
+        await (await manager.connect(websocket)).start()
+
+        async def listen():
+            for data in ("not json", '{"task_id": "1", "status": "started"}'):
+                yield {"type": "pmessage", "channel": "task_updates_1", "data": data}
+
+        hub.pubsub = MagicMock(PUBLISH_MESSAGE_TYPES=("pmessage",), listen=listen)
+        await hub.start_listening()
+        await hub.listener_task
+        await drain_writers()
+
+        websocket.send_text.assert_awaited_once_with(
+            '{"task_id": "1", "status": "started"}'
+        )
+
+
+@pytest.mark.asyncio
+class TestTaskChannelMultiplexer:
+    async def test_subscribes_once_per_task(self):
+        multiplexer = TaskChannelMultiplexer(PATTERN_LAYOUT, MagicMock())
+        multiplexer.pubsub = AsyncMock()
+
+        connection_1 = await multiplexer.watch("1", mock_websocket())
+        connection_2 = await multiplexer.watch("1", mock_websocket())
+        await multiplexer.unwatch("1", connection_1)
+
+        multiplexer.pubsub.subscribe.assert_awaited_once_with("task_updates_1")
+        multiplexer.pubsub.unsubscribe.assert_not_awaited()
+
+        await multiplexer.unwatch("1", connection_2)
+
+        multiplexer.pubsub.unsubscribe.assert_awaited_once_with("task_updates_1")
+        assert multiplexer.watchers == {}
+
+    async def test_sharded_layout_subscribes_once_per_shard(self):
+        layout = TaskChannelLayout("task_updates", ChannelLayout.SHARDED, shards=1)
+        multiplexer = TaskChannelMultiplexer(layout, MagicMock())
+        multiplexer.pubsub = AsyncMock()
+
+        connection_1 = await multiplexer.watch("1", mock_websocket())
+        connection_2 = await multiplexer.watch("2", mock_websocket())
+        await multiplexer.unwatch("1", connection_1)
+
+        multiplexer.pubsub.ssubscribe.assert_awaited_once_with("task_updates:0")
+        multiplexer.pubsub.sunsubscribe.assert_not_awaited()
+
+        await multiplexer.unwatch("2", connection_2)
+
+        multiplexer.pubsub.sunsubscribe.assert_awaited_once_with("task_updates:0")
+        assert multiplexer.channel_tasks == {}
+
+    async def test_deliver_only_to_task_watchers(self):
+        multiplexer = TaskChannelMultiplexer(PATTERN_LAYOUT, MagicMock())
+        multiplexer.pubsub = AsyncMock()
+        websocket_1, websocket_2 = mock_websocket(), mock_websocket()
+        await (await multiplexer.watch("1", websocket_1)).start()
+        await (await multiplexer.watch("2", websocket_2)).start()
+
+        multiplexer.deliver("1", TaskUpdateMessage('{"task_id": "1"}'))
+        await drain_writers()
+
+        websocket_1.send_text.assert_awaited_once_with('{"task_id": "1"}')
+        websocket_2.send_text.assert_not_awaited()
@@ -0,0 +1,72 @@
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.domains.monitoring.pipeline import PersistenceStage, TaskStatusEvent
+from app.domains.task import TaskStatus
+
+
+def mock_repository_factory(repository: AsyncMock):
+    @asynccontextmanager
+    async def set_up_repository():
+        yield repository
+
+    return set_up_repository
+
+
+@pytest.mark.asyncio
+class TestPersistenceStage:
+    async def test_flush_keeps_latest_status_per_task(self):
+        task_repo, task_result_repo = AsyncMock(), AsyncMock()
+        stage = PersistenceStage(workers=1, batch_size=10, flush_interval_ms=10)
+
+        with (
+            patch(
+                "app.domains.monitoring.pipeline.set_up_task_repository",
+                mock_repository_factory(task_repo),
+            ),
+            patch(
+                "app.domains.monitoring.pipeline.set_up_task_result_repository",
+                mock_repository_factory(task_result_repo),
+            ),
+        ):
+            stage.start()
+            await stage.submit(TaskStatusEvent("1", TaskStatus.STARTED))
+            await stage.submit(TaskStatusEvent("2", TaskStatus.STARTED))
+            await stage.submit(TaskStatusEvent("1", TaskStatus.FINISHED, {"a": 1}))
+            await stage.stop()
+
+        (updates,) = task_repo.update_statuses.await_args.args
+        assert {(update.id, update.status) for update in updates} == {
+            ("1", TaskStatus.FINISHED),
+            ("2", TaskStatus.STARTED),
+        }
+        (results,) = task_result_repo.add_many.await_args.args
+        assert [result.task_id for result in results] == ["1"]
+
+    async def test_failed_flush_is_retried_once(self):
+        task_repo = AsyncMock()
+        task_repo.update_statuses.side_effect = [RuntimeError("db down"), 1]
+        stage = PersistenceStage(workers=1, batch_size=10, flush_interval_ms=1)
+
+        with patch(
+            "app.domains.monitoring.pipeline.set_up_task_repository",
+            mock_repository_factory(task_repo),
+        ):
+            stage.start()
+            await stage.submit(TaskStatusEvent("1", TaskStatus.STARTED))
+            await stage.stop()
+
+        assert task_repo.update_statuses.await_count == 2
+        assert (stage.retried_events, stage.failed_events) == (1, 0)
+        assert stage.flushed_events == 1
+
+    async def test_submit_nowait_drops_when_the_partition_is_full(self):
+        stage = PersistenceStage(workers=1, queue_size=1)
+
+        assert stage.submit_nowait(TaskStatusEvent("1", TaskStatus.STARTED))
+        assert not stage.submit_nowait(TaskStatusEvent("1", TaskStatus.FINISHED))
+
+        assert stage.stats()["dropped_events"] == 1
+        assert stage.queue_depth == 1
@@ -1,3 +1,29 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from app.domains.monitoring.routes import receive_pongs
+
+
 class TestMonitoringRoutes:
     def test_something(self, client) -> None:
         pass
+
+
+@pytest.mark.asyncio
+class TestReceivePongs:
+    async def test_text_and_binary_frames_count_as_pongs(self):
+        websocket = AsyncMock()
+        websocket.receive.side_effect = [
+            {"type": "websocket.receive", "text": "pong"},
+            {"type": "websocket.receive", "bytes": b"pong"},
+            {"type": "websocket.disconnect", "code": 1001},
+        ]
+        connection = MagicMock()
+
+        with pytest.raises(WebSocketDisconnect) as disconnect:
+            await receive_pongs(websocket, connection)
+
+        assert connection.touch.call_count == 2
+        assert disconnect.value.code == 1001
@@ -0,0 +1,144 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from app import serialization
+from app.domains.monitoring import stream
+from app.domains.task import TaskApiResponse, TaskStatus
+from app.settings import settings
+from app.tasks.common import _publish_status, write_queued_snapshots
+
+
+async def publish_updates(redis_conn, *task_ids: str) -> list[str]:
+    for task_id in task_ids:
+        await _publish_status(redis_conn, task_id, TaskStatus.STARTED)
+    return [
+        event_id for event_id, _ in await redis_conn.xrange(settings.task_events_stream)
+    ]
+
+
+@pytest.mark.asyncio
+class TestReadTaskEvents:
+    async def test_pages_through_the_stream(self):
+        redis_conn = FakeRedis(decode_responses=True)
+        event_ids = await publish_updates(redis_conn, "a", "b", "a", "b", "a")
+
+        replay = await stream.read_task_events(
+            redis_conn, event_ids[0], task_id="a", page_size=2
+        )
+
+        assert [m.event_id for m in replay.events] == [event_ids[2], event_ids[4]]
+        assert replay.last_event_id == event_ids[4]
+        assert replay.complete
+
+    async def test_is_incomplete_past_the_limit(self):
+        redis_conn = FakeRedis(decode_responses=True)
+        event_ids = await publish_updates(redis_conn, "a", "b", "c", "d")
+
+        replay = await stream.read_task_events(
+            redis_conn, event_ids[0], limit=2, page_size=2
+        )
+
+        assert [m.task_id for m in replay.events] == ["b", "c"]
+        assert not replay.complete
+        assert replay.resync_message().data == {
+            "resync": True,
+            "event_id": event_ids[2],
+        }
+
+    async def test_is_incomplete_after_the_stream_was_trimmed(self):
+        redis_conn = FakeRedis(decode_responses=True)
+        event_ids = await publish_updates(redis_conn, "a", "b", "c")
+        await redis_conn.xtrim(settings.task_events_stream, maxlen=1)
+
+        replay = await stream.read_task_events(redis_conn, event_ids[0])
+
+        assert [m.task_id for m in replay.events] == ["c"]
+        assert not replay.complete
+
+
+@pytest.mark.asyncio
+class TestReadTaskState:
+    async def test_reads_the_snapshot(self, monkeypatch):
+        redis_conn = FakeRedis(decode_responses=True)
+        await _publish_status(redis_conn, "a", TaskStatus.STARTED)
+
+        async def lookup_tasks(task_ids, task_queue):
+            raise AssertionError("the snapshot should answer")
+
+        monkeypatch.setattr(stream, "lookup_tasks", lookup_tasks)
+        [message] = await stream.read_task_state(redis_conn, None, "a")
+
+        assert message.data["status"] == TaskStatus.STARTED
+        assert message.event_id
+
+    async def test_queued_snapshots_keep_published_updates(self, monkeypatch):
+        redis_conn = FakeRedis(decode_responses=True)
+        await _publish_status(redis_conn, "a", TaskStatus.STARTED)
+        await write_queued_snapshots(
+            redis_conn, {"a": {}, "b": {"created_by": "1", "task_type": "sample"}}
+        )
+
+        async def lookup_tasks(task_ids, task_queue):
+            raise AssertionError("the snapshot should answer")
+
+        monkeypatch.setattr(stream, "lookup_tasks", lookup_tasks)
+        [started] = await stream.read_task_state(redis_conn, None, "a")
+        [queued] = await stream.read_task_state(redis_conn, None, "b")
+
+        assert started.data["status"] == TaskStatus.STARTED
+        assert queued.data == {
+            "task_id": "b",
+            "status": "queued",
+            "result": None,
+            "created_by": "1",
+            "task_type": "sample",
+        }
+
+    async def test_falls_back_to_rq_and_the_database(self, monkeypatch):
+        redis_conn = FakeRedis(decode_responses=True)
+
+        async def lookup_tasks(task_ids, task_queue):
+            return {"a": TaskApiResponse(task_id="a", status=TaskStatus.CANCELLED)}
+
+        monkeypatch.setattr(stream, "lookup_tasks", lookup_tasks)
+        [message] = await stream.read_task_state(redis_conn, None, "a")
+
+        assert message.data == {"task_id": "a", "status": "cancelled", "result": None}
+        assert await stream.read_task_state(redis_conn, None, "unknown") == []
+
+
+@pytest.mark.asyncio
+class TestTaskEventStreamConsumer:
+    async def test_new_group_skips_events_already_in_the_stream(self):
+        redis_conn = FakeRedis(decode_responses=True)
+        await publish_updates(redis_conn, "a")
+        consumer = stream.TaskEventStreamConsumer(redis_conn, MagicMock())
+        await consumer.setup()
+        await publish_updates(redis_conn, "b")
+
+        response = await redis_conn.xreadgroup(
+            consumer.group, consumer.consumer, {consumer.stream: ">"}
+        )
+
+        [(_, entries)] = response
+        assert [
+            serialization.loads(fields["data"])["task_id"] for _, fields in entries
+        ] == ["b"]
+
+    async def test_deleted_entries_are_acknowledged_and_skipped(self):
+        redis_conn = AsyncMock()
+        persistence = MagicMock(submit=AsyncMock())
+        consumer = stream.TaskEventStreamConsumer(redis_conn, persistence)
+
+        await consumer._submit(
+            [
+                ("1-1", None),
+                ("1-2", {"data": '{"task_id": "a", "status": "started"}'}),
+            ]
+        )
+
+        redis_conn.xack.assert_awaited_once_with(consumer.stream, consumer.group, "1-1")
+        [(event,), _] = persistence.submit.await_args
+        assert (event.task_id, event.stream_id) == ("a", "1-2")
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.domains.monitoring.waiters import TaskWaiters
+from app.domains.task import TaskApiResponse, TaskStatus, TaskWaitMode
+from app.domains.task import routes as task_routes
+
+
+def lookup_returning(*tasks: TaskApiResponse):
+    async def lookup(task_ids, task_queue):
+        return {task.task_id: task for task in tasks if task.task_id in task_ids}
+
+    return lookup
+
+
+@pytest.mark.asyncio
+class TestTaskWaiters:
+    async def test_waiters_share_one_future_until_the_last_leaves(self):
+        waiters = TaskWaiters()
+        with waiters.waiting(["a"]) as first, waiters.waiting(["a", "b"]) as second:
+            assert first["a"] is second["a"]
+            assert len(waiters) == 2
+
+            waiters.resolve("a", {"task_id": "a", "status": "finished"})
+            waiters.resolve("a", {"task_id": "a", "status": "failed"})
+
+            assert first["a"].result()["status"] == "finished"
+            assert waiters.stats.resolved_tasks == 1
+
+        assert len(waiters) == 0
+
+    async def test_resolve_without_waiters_is_ignored(self):
+        waiters = TaskWaiters()
+        waiters.resolve("a", {"task_id": "a", "status": "finished"})
+        assert waiters.stats.resolved_tasks == 0
+
+
+@pytest.mark.asyncio
+class TestWaitForTasks:
+    async def test_returns_when_any_task_finishes(self, monkeypatch):
+        hub = SimpleNamespace(waiters=TaskWaiters())
+        monkeypatch.setattr(
+            task_routes,
+            "lookup_tasks",
+            lookup_returning(
+                TaskApiResponse(task_id="a", status=TaskStatus.STARTED),
+                TaskApiResponse(task_id="b", status=TaskStatus.QUEUED),
+            ),
+        )
+
+        waiting = asyncio.create_task(
+            task_routes._wait_for_tasks(["a", "b"], None, hub, 5, TaskWaitMode.ANY)
+        )
+        await asyncio.sleep(0)
+        hub.waiters.resolve(
+            "a", {"task_id": "a", "status": "finished", "result": {"ok": True}}
+        )
+        found = await asyncio.wait_for(waiting, 1)
+
+        assert found["a"].status == TaskStatus.FINISHED
+        assert found["a"].result == {"ok": True}
+        assert found["b"].status == TaskStatus.QUEUED
+        assert len(hub.waiters) == 0
+
+    async def test_returns_current_status_on_timeout(self, monkeypatch):
+        hub = SimpleNamespace(waiters=TaskWaiters())
+        monkeypatch.setattr(
+            task_routes,
+            "lookup_tasks",
+            lookup_returning(TaskApiResponse(task_id="a", status=TaskStatus.STARTED)),
+        )
+
+        found = await task_routes._wait_for_tasks(
+            ["a", "unknown"], None, hub, 0.01, TaskWaitMode.ALL
+        )
+
+        assert found == {"a": TaskApiResponse(task_id="a", status=TaskStatus.STARTED)}
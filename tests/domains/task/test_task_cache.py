@@ -0,0 +1,62 @@
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from app import redis as app_redis
+from app import serialization
+from app.cache import local_cache
+from app.domains.task import TaskStatus
+from app.domains.task.cache import (
+    TASK_STATUS_CACHE_NAMESPACE,
+    TASK_STATUS_CACHE_TTL,
+    TASK_STATUS_STALE_TTL,
+    TERMINAL_TASK_STATUS_CACHE_TTL,
+    refresh_cached_task_status,
+    task_status_cache_key,
+)
+from app.tasks.common import _publish_status
+
+
+@pytest.fixture
+def cache_version(monkeypatch):
+    monkeypatch.setattr(
+        app_redis, "_cache_versions", {TASK_STATUS_CACHE_NAMESPACE: (0, 3)}
+    )
+    local_cache.clear()
+    yield 3
+    local_cache.clear()
+
+
+@pytest.mark.asyncio
+class TestTaskStatusCache:
+    async def test_updates_replace_cached_entries_only(self, cache_version):
+        key = task_status_cache_key("1", cache_version)
+        local_cache.set(key, '{"task_id":"1","status":"started","result":{}}', 60)
+
+        refresh_cached_task_status({"task_id": "1", "status": "finished"})
+        refresh_cached_task_status({"task_id": "2", "status": "finished"})
+
+        assert serialization.loads(local_cache.get(key))["status"] == "finished"
+        assert local_cache.get(task_status_cache_key("2", cache_version)) is None
+
+    async def test_published_statuses_are_cached_longer_once_terminal(self):
+        redis_conn = FakeRedis(decode_responses=True)
+        await redis_conn.set(
+            app_redis.cache_version_key(TASK_STATUS_CACHE_NAMESPACE), 2
+        )
+        key = task_status_cache_key("1", 2)
+
+        await _publish_status(redis_conn, "1", TaskStatus.STARTED)
+        assert (
+            await redis_conn.ttl(key) == TASK_STATUS_CACHE_TTL + TASK_STATUS_STALE_TTL
+        )
+
+        await _publish_status(redis_conn, "1", TaskStatus.FINISHED, {"value": 1})
+        assert serialization.loads(await redis_conn.get(key)) == {
+            "task_id": "1",
+            "status": "finished",
+            "result": {"value": 1},
+        }
+        assert (
+            await redis_conn.ttl(key)
+            == TERMINAL_TASK_STATUS_CACHE_TTL + TASK_STATUS_STALE_TTL
+        )
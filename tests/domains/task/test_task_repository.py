@@ -0,0 +1,33 @@
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.domains.task import TaskCreate, TaskStatus, TaskType, TaskUpdate
+from app.repositories.task import TaskRepository
+
+
+@pytest.mark.asyncio
+class TestTaskRepository:
+    async def test_update_statuses_are_read_back(
+        self, setup_database, async_session: AsyncSession
+    ):
+        repo = TaskRepository(async_session)
+        task_ids = [str(uuid.uuid4()) for _ in range(2)]
+        await repo.add_many(
+            [TaskCreate(id=task_id, task_type=TaskType.SAMPLE) for task_id in task_ids]
+        )
+
+        await repo.update_statuses(
+            [
+                TaskUpdate(id=task_ids[0], status=TaskStatus.STARTED),
+                TaskUpdate(id=task_ids[1], status=TaskStatus.FAILED),
+            ]
+        )
+
+        assert (await repo.get(task_ids[0])).status == TaskStatus.STARTED
+        tasks = await repo.get_many_with_results(task_ids)
+        assert {task.id: task.status for task in tasks} == {
+            task_ids[0]: TaskStatus.STARTED,
+            task_ids[1]: TaskStatus.FAILED,
+        }
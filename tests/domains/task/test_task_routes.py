@@ -1,10 +1,23 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
 import pytest
+from fakeredis import FakeServer, FakeStrictRedis
+from fakeredis.aioredis import FakeRedis
 from httpx import AsyncClient
+from redis.exceptions import ConnectionError
+from rq import Queue
 
+from app import redis as app_redis
+from app import serialization
 from app.auth import get_current_user
-from app.domains.task import TaskStatus, TaskType
+from app.cache import local_cache
+from app.domains.task import TaskApiResponse, TaskStatus, TaskType, lookup
+from app.domains.task import routes as task_routes
+from app.domains.task.cache import TASK_STATUS_CACHE_NAMESPACE, task_status_cache_key
 from app.domains.user import User
 from app.main import app
+from app.tasks.common import task_channels, task_snapshot_key
 
 
 def mock_jwt_get_user() -> User:
@@ -37,6 +50,36 @@ class TestTaskRoutes:
         assert response2.status_code == 200
         assert response.json()["id"] != response2.json()["id"]
 
+    async def test_create_tasks_in_batch(self, client: AsyncClient):
+        response = await client.post(
+            "/tasks/batch",
+            json={"tasks": [{"task_type": TaskType.SAMPLE}] * 3},
+        )
+        task_ids = response.json()["task_ids"]
+        assert response.status_code == 200
+        assert len(set(task_ids)) == 3
+
+        response2 = await client.get(f"/tasks/{task_ids[0]}")
+        assert response2.status_code == 200
+        assert response2.json()["status"] == TaskStatus.QUEUED
+
+    async def test_create_tasks_in_batch_rejects_empty_batch(self, client: AsyncClient):
+        response = await client.post("/tasks/batch", json={"tasks": []})
+        assert response.status_code == 422
+
+    async def test_get_task_statuses(self, client: AsyncClient):
+        response = await client.post(
+            "/tasks/batch",
+            json={"tasks": [{"task_type": TaskType.SAMPLE}] * 2},
+        )
+        task_ids = response.json()["task_ids"]
+
+        response2 = await client.get("/tasks/", params={"ids": [*task_ids, "unknown"]})
+        data = response2.json()
+        assert response2.status_code == 200
+        assert [task["task_id"] for task in data["tasks"]] == task_ids
+        assert data["not_found"] == ["unknown"]
+
     async def test_create_task_with_invalid_type(self, client: AsyncClient):
         response = await client.post("/tasks/", params={"task_type": "invalid_type"})
         assert response.status_code == 422
@@ -47,3 +90,132 @@ class TestTaskRoutes:
         response2 = await client.get(f"/tasks/{task_id}")
         assert response2.status_code == 200
         assert response2.json()["status"] == TaskStatus.QUEUED
+
+
+class TestLiveTaskStatus:
+    def test_cancelled_jobs_are_reported_as_cancelled(self):
+        task_queue = Queue(connection=FakeStrictRedis())
+        job = task_queue.enqueue(print, 100)
+        job.cancel()
+
+        live_task = lookup.fetch_live_task(task_queue, job.id)
+        [live_tasks] = lookup.fetch_live_tasks(task_queue, [job.id])
+
+        assert live_task.status == TaskStatus.CANCELLED
+        assert live_tasks.status == TaskStatus.CANCELLED
+
+
+class UnavailableRedis:
+    async def get(self, key):
+        raise ConnectionError("Redis is down")
+
+    async def mget(self, keys):
+        raise ConnectionError("Redis is down")
+
+    def pipeline(self, transaction=True):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.mark.asyncio
+class TestBulkTaskStatus:
+    async def test_fails_open_when_redis_is_unavailable(self, monkeypatch):
+        async def lookup_tasks(task_ids, task_queue):
+            return {
+                task_id: TaskApiResponse(task_id=task_id, status=TaskStatus.STARTED)
+                for task_id in task_ids
+                if task_id != "unknown"
+            }
+
+        monkeypatch.setattr(task_routes, "get_shared_redis", UnavailableRedis)
+        monkeypatch.setattr(app_redis, "get_shared_redis", UnavailableRedis)
+        monkeypatch.setattr(task_routes, "lookup_tasks", lookup_tasks)
+        monkeypatch.setattr(
+            app_redis, "_cache_versions", {TASK_STATUS_CACHE_NAMESPACE: (0, 3)}
+        )
+        local_cache.clear()
+        local_cache.set(
+            task_status_cache_key("a", 3),
+            '{"task_id":"a","status":"finished","result":{}}',
+            60,
+        )
+
+        response = await task_routes.get_task_statuses(["a", "b", "unknown"], None)
+        local_cache.clear()
+
+        assert [task.status for task in response.tasks] == [
+            TaskStatus.FINISHED,
+            TaskStatus.STARTED,
+        ]
+        assert response.not_found == ["unknown"]
+
+    async def test_refreshes_stale_entries(self, monkeypatch):
+        redis_conn = FakeRedis(decode_responses=True)
+        fresh_key, stale_key = (task_status_cache_key(t, 3) for t in ("a", "b"))
+        await redis_conn.set(
+            fresh_key, '{"task_id":"a","status":"started","result":{}}', ex=60
+        )
+        await redis_conn.set(
+            stale_key, '{"task_id":"b","status":"started","result":{}}', ex=5
+        )
+        looked_up = []
+
+        async def lookup_tasks(task_ids, task_queue):
+            looked_up.extend(task_ids)
+            return {
+                task_id: TaskApiResponse(task_id=task_id, status=TaskStatus.FINISHED)
+                for task_id in task_ids
+            }
+
+        monkeypatch.setattr(task_routes, "get_shared_redis", lambda: redis_conn)
+        monkeypatch.setattr(task_routes, "lookup_tasks", lookup_tasks)
+        monkeypatch.setattr(app_redis, "_cache_versions", {})
+        monkeypatch.setattr(app_redis, "get_shared_redis", lambda: redis_conn)
+        await redis_conn.set(
+            app_redis.cache_version_key(TASK_STATUS_CACHE_NAMESPACE), 3
+        )
+        local_cache.clear()
+
+        response = await task_routes.get_task_statuses(["a", "b"], None)
+
+        assert looked_up == ["b"]
+        assert [task.status for task in response.tasks] == [
+            TaskStatus.STARTED,
+            TaskStatus.FINISHED,
+        ]
+        refreshed = TaskApiResponse.model_validate_json(await redis_conn.get(stale_key))
+        assert refreshed.status == TaskStatus.FINISHED
+        assert await redis_conn.ttl(stale_key) > 3_600
+
+
+@pytest.mark.asyncio
+class TestCancelTask:
+    async def test_publishes_the_cancellation(self, monkeypatch):
+        server = FakeServer()
+        task_queue = Queue(connection=FakeStrictRedis(server=server))
+        redis_conn = FakeRedis(server=server, decode_responses=True)
+        job = task_queue.enqueue(print, 100, meta={"task_type": TaskType.SAMPLE})
+        updates = []
+
+        @asynccontextmanager
+        async def set_up_task_repository():
+            async def update(task):
+                updates.append(task)
+
+            yield SimpleNamespace(update=update)
+
+        monkeypatch.setattr(task_routes, "get_shared_redis", lambda: redis_conn)
+        monkeypatch.setattr(
+            task_routes, "set_up_task_repository", set_up_task_repository
+        )
+        pubsub = task_channels.pubsub(redis_conn)
+        await task_channels.subscribe_all(pubsub)
+        await pubsub.get_message(timeout=1)
+
+        await task_routes.cancel_task(job.id, mock_jwt_get_user(), task_queue)
+
+        snapshot = serialization.loads(await redis_conn.get(task_snapshot_key(job.id)))
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+        assert updates[0].status == TaskStatus.CANCELLED
+        assert snapshot["status"] == TaskStatus.CANCELLED
+        assert snapshot["task_type"] == TaskType.SAMPLE
+        assert serialization.loads(message["data"]) == snapshot
@@ -0,0 +1,249 @@
+import asyncio
+from typing import Annotated
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+from fastapi import Depends, HTTPException
+from redis.exceptions import ConnectionError
+
+from app import redis as app_redis
+from app.cache import LocalCache, cache_stats, local_cache
+from app.domains.task import TaskApiResponse, TaskStatus
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis(decode_responses=True)
+    monkeypatch.setenv("DISABLE_CACHE", "false")
+    monkeypatch.setattr(app_redis, "get_shared_redis", lambda: client)
+    monkeypatch.setattr(app_redis, "_cache_versions", {})
+    local_cache.clear()
+    yield client
+    local_cache.clear()
+
+
+class TestLocalCache:
+    def test_evicts_least_recently_used(self):
+        cache = LocalCache(max_entries=2, max_bytes=1_000)
+        cache.set("a", "1", 60)
+        cache.set("b", "2", 60)
+        cache.get("a")
+        cache.set("c", "3", 60)
+
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert len(cache) == 2
+
+    def test_bounds_total_size(self):
+        cache = LocalCache(max_entries=10, max_bytes=10)
+        cache.set("a", "x" * 6, 60)
+        cache.set("b", "y" * 6, 60)
+        cache.set("c", "z" * 11, 60)
+
+        assert cache.get("a") is None
+        assert cache.get("b") == "y" * 6
+        assert cache.get("c") is None
+        assert cache.size == 6
+
+    def test_expires_entries(self, monkeypatch):
+        cache = LocalCache(max_entries=10, max_bytes=1_000)
+        monkeypatch.setattr("app.cache.time.monotonic", lambda: 100)
+        cache.set("a", "1", 1)
+        cache.set("b", "2", 0)
+        monkeypatch.setattr("app.cache.time.monotonic", lambda: 101)
+
+        assert cache.get("a") is None
+        assert cache.get("b") is None
+        assert cache.size == 0
+
+
+@pytest.mark.asyncio
+class TestCached:
+    async def test_answers_from_memory_then_redis(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60)
+        async def cached_task_status(task_id: str) -> TaskApiResponse:
+            calls.append(task_id)
+            return TaskApiResponse(task_id=task_id, status=TaskStatus.FINISHED)
+
+        assert await cached_task_status(task_id="1") == TaskApiResponse(
+            task_id="1", status=TaskStatus.FINISHED
+        )
+        assert await cached_task_status(task_id="1") == {
+            "task_id": "1",
+            "status": "finished",
+            "result": None,
+        }
+        local_cache.clear()
+        await cached_task_status(task_id="1")
+
+        assert calls == ["1"]
+        stats = cache_stats["cached_task_status"].as_dict()
+        assert (stats["misses"], stats["local_hits"], stats["redis_hits"]) == (1, 1, 1)
+        assert stats["local_hit_ratio"] == pytest.approx(0.333)
+        assert 0 < await fake_redis.ttl(next(iter(await fake_redis.keys()))) <= 60
+
+    async def test_keys_ignore_injected_parameters(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60)
+        async def cached_lookup(task_id: str, queue: Annotated[object, Depends(list)]):
+            calls.append(task_id)
+            return {"task_id": task_id}
+
+        await cached_lookup("1", queue=object())
+        await cached_lookup("1", queue=object())
+        await cached_lookup("2", queue=object())
+
+        assert calls == ["1", "2"]
+        keys = await fake_redis.keys("*:cached_lookup:v0:*")
+        assert len(keys) == 2
+        assert len({len(key) for key in keys}) == 1
+
+    async def test_invalidate_cache_moves_to_a_new_version(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60, key_params=["task_id"], namespace="statuses")
+        async def cached_status(task_id: str, verbose: bool = False):
+            calls.append(task_id)
+            return {"task_id": task_id}
+
+        await cached_status("1")
+        await cached_status("1", verbose=True)
+        assert await app_redis.invalidate_cache("statuses") == 1
+        await cached_status("1")
+
+        assert calls == ["1", "1"]
+        assert await fake_redis.keys("*:statuses:v1:*")
+
+    async def test_rejects_unknown_key_params(self):
+        with pytest.raises(ValueError):
+
+            @app_redis.cached(key_params=["task"])
+            async def cached_status(task_id: str): ...
+
+    async def test_concurrent_misses_share_one_call(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60)
+        async def slow_status(task_id: str):
+            calls.append(task_id)
+            await asyncio.sleep(0.01)
+            return {"task_id": task_id}
+
+        results = await asyncio.gather(*(slow_status("1") for _ in range(10)))
+
+        assert calls == ["1"]
+        assert results == [{"task_id": "1"}] * 10
+        assert cache_stats["slow_status"].coalesced == 9
+
+    async def test_waits_for_the_replica_holding_the_lock(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60, lock_timeout=1)
+        async def locked_status(task_id: str):
+            calls.append(task_id)
+            return {"task_id": task_id}
+
+        key = app_redis.make_cache_key("locked_status", 0, {"task_id": "1"})
+        await fake_redis.set(f"{key}:lock", "other replica")
+
+        async def fill_elsewhere():
+            await asyncio.sleep(0.1)
+            await fake_redis.setex(key, 60, '{"task_id":"elsewhere"}')
+
+        filling = asyncio.create_task(fill_elsewhere())
+        assert await locked_status("1") == {"task_id": "elsewhere"}
+        await filling
+
+        assert calls == []
+        assert cache_stats["locked_status"].lock_waits == 1
+
+    async def test_calls_the_function_when_waiting_for_the_lock_fails(
+        self, fake_redis, monkeypatch
+    ):
+        calls = []
+
+        @app_redis.cached(ttl=60, lock_timeout=1)
+        async def unwaited_status(task_id: str):
+            calls.append(task_id)
+            return {"task_id": task_id}
+
+        async def wait_for_fill(*args):
+            raise ConnectionError("Redis is down")
+
+        key = app_redis.make_cache_key("unwaited_status", 0, {"task_id": "1"})
+        await fake_redis.set(f"{key}:lock", "other replica")
+        monkeypatch.setattr(app_redis, "_wait_for_fill", wait_for_fill)
+
+        assert await unwaited_status("1") == {"task_id": "1"}
+        assert calls == ["1"]
+
+    async def test_serves_stale_entries_while_refreshing(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60, stale_ttl=30)
+        async def refreshed_status(task_id: str):
+            calls.append(task_id)
+            return {"task_id": task_id, "call": len(calls)}
+
+        await refreshed_status("1")
+        key = app_redis.make_cache_key("refreshed_status", 0, {"task_id": "1"})
+        assert 60 < await fake_redis.ttl(key) <= 90
+
+        local_cache.clear()
+        await fake_redis.expire(key, 20)
+        assert await refreshed_status("1") == {"task_id": "1", "call": 1}
+        await asyncio.sleep(0.01)
+
+        assert await refreshed_status("1") == {"task_id": "1", "call": 2}
+        assert 60 < await fake_redis.ttl(key) <= 90
+        stats = cache_stats["refreshed_status"]
+        assert (stats.stale_hits, stats.refreshes, stats.misses) == (1, 1, 1)
+
+    async def test_caches_not_found_errors(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60, negative_ttl=5)
+        async def missing_status(task_id: str):
+            calls.append(task_id)
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await missing_status("1")
+            assert error.value.status_code == 404
+            assert error.value.detail == "Task not found"
+        local_cache.clear()
+        with pytest.raises(HTTPException):
+            await missing_status("1")
+
+        assert calls == ["1"]
+        stats = cache_stats["missing_status"]
+        assert (stats.negative_hits, stats.local_hits, stats.redis_hits) == (2, 1, 1)
+
+    async def test_waits_for_the_not_found_error_of_another_replica(self, fake_redis):
+        calls = []
+
+        @app_redis.cached(ttl=60, lock_timeout=1, negative_ttl=5)
+        async def locked_missing_status(task_id: str):
+            calls.append(task_id)
+            return {"task_id": task_id}
+
+        key = app_redis.make_cache_key("locked_missing_status", 0, {"task_id": "1"})
+        await fake_redis.set(f"{key}:lock", "other replica")
+
+        async def fail_elsewhere():
+            await asyncio.sleep(0.1)
+            await fake_redis.setex(f"{key}:not_found", 5, '{"detail":"Task not found"}')
+
+        failing = asyncio.create_task(fail_elsewhere())
+        with pytest.raises(HTTPException) as error:
+            await locked_missing_status("1")
+        await failing
+
+        assert error.value.status_code == 404
+        assert calls == []
+        stats = cache_stats["locked_missing_status"]
+        assert (stats.lock_waits, stats.negative_hits) == (1, 1)